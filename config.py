@@ -46,6 +46,11 @@ def load_config(script_dir):
         "ONEDRIVE_SEARCH_DIR": os.getenv("ONEDRIVE_SEARCH_DIR", ""),
         "ONEDRIVE_MAX_FILES": int(os.getenv("ONEDRIVE_MAX_FILES", "5")),
         "ONEDRIVE_FILE_TYPES": parse_file_types(os.getenv("ONEDRIVE_FILE_TYPES", "")),
+        "ONEDRIVE_INDEX_ENABLED": os.getenv("ONEDRIVE_INDEX_ENABLED", "1") == "1",
+        "ONEDRIVE_INDEX_REFRESH_INTERVAL": int(os.getenv("ONEDRIVE_INDEX_REFRESH_INTERVAL", "60")),
+        "ONEDRIVE_INCLUDE_CLOUD_ONLY": os.getenv("ONEDRIVE_INCLUDE_CLOUD_ONLY", "0") == "1",
+        "ONEDRIVE_TEXT_CACHE_ENABLED": os.getenv("ONEDRIVE_TEXT_CACHE_ENABLED", "1") == "1",
+        "ONEDRIVE_TEXT_CACHE_MAX_MB": int(os.getenv("ONEDRIVE_TEXT_CACHE_MAX_MB", "512")),
         "SKIP_VERIFICATION": os.getenv("SKIP_VERIFICATION", "0") == "1"
     }
 
@@ -71,6 +76,9 @@ def load_config(script_dir):
         logger.info(f"OneDrive検索ディレクトリ: {config['ONEDRIVE_SEARCH_DIR'] if config['ONEDRIVE_SEARCH_DIR'] else 'OneDriveルート'}")
         logger.info(f"OneDrive最大ファイル数: {config['ONEDRIVE_MAX_FILES']}")
         logger.info(f"OneDrive検索対象ファイル: {', '.join(config['ONEDRIVE_FILE_TYPES']) if config['ONEDRIVE_FILE_TYPES'] else '全ファイル'}")
+        logger.info(f"OneDriveファイルインデックス: {'有効' if config['ONEDRIVE_INDEX_ENABLED'] else '無効'} (更新間隔: {config['ONEDRIVE_INDEX_REFRESH_INTERVAL']}秒)")
+        logger.info(f"オンライン専用ファイル: {'検索対象に含める' if config['ONEDRIVE_INCLUDE_CLOUD_ONLY'] else '除外'}")
+        logger.info(f"ファイル内容のディスクキャッシュ: {'有効' if config['ONEDRIVE_TEXT_CACHE_ENABLED'] else '無効'} (上限: {config['ONEDRIVE_TEXT_CACHE_MAX_MB']}MB)")
 
     # 環境変数のバックアップ（.envが読み込めなかった場合）
     if not config['OLLAMA_URL']:
@@ -1,32 +1,113 @@
 # file_extractor.py - ファイル内容抽出機能
 import os
+import codecs
 import logging
-import subprocess
 import re
 import traceback
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import zipfile
+import xml.etree.ElementTree as ET
 from datetime import datetime
 import io
 
 logger = logging.getLogger(__name__)
 
+# Office Open XML の名前空間（zipfileで直接読み取る場合に使用）
+_WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_SHEET_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_PACKAGE_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+_DRAWING_NS = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+_DC_NS = "{http://purl.org/dc/elements/1.1/}"
+
+# 要素名（名前空間付き）は要素ごとに連結せず、ここで一度だけ組み立てる
+_W_T = _WORD_NS + 't'
+_W_P = _WORD_NS + 'p'
+_S_SI = _SHEET_NS + 'si'
+_S_T = _SHEET_NS + 't'
+_S_SHEET = _SHEET_NS + 'sheet'
+_S_ROW = _SHEET_NS + 'row'
+_S_C = _SHEET_NS + 'c'
+_S_V = _SHEET_NS + 'v'
+_R_ID = _REL_NS + 'id'
+_RELATIONSHIP = _PACKAGE_REL_NS + 'Relationship'
+_A_T = _DRAWING_NS + 't'
+_A_P = _DRAWING_NS + 'p'
+_DC_TITLE = _DC_NS + 'title'
+
+# テキストファイルとして読み込む拡張子
+_TEXT_EXTS = frozenset({'.txt', '.md', '.csv', '.json', '.xml', '.html', '.htm', '.log', '.py', '.js', '.css'})
+
+# pypdfium2（PDFium）はスレッドセーフではなく、別々の文書でも複数スレッドから同時に呼び出せないため、
+# 文書を開いてから閉じるまでをこのロックで直列化する（他の形式の抽出は並列のまま）
+_PDFIUM_LOCK = threading.Lock()
+
+# PowerPointのスライドXML（ppt/slides/slide1.xml など）
+_SLIDE_NAME_RE = re.compile(r'^ppt/slides/slide(\d+)\.xml$')
+
+class _TextCollector(list):
+    """抽出したテキストを行単位で集め、文字数の上限に達したかを追跡するリスト"""
+
+    def __init__(self, max_chars=None):
+        super().__init__()
+        self.max_chars = max_chars
+        self.total_chars = 0
+
+    def append(self, text):
+        super().append(text)
+        self.total_chars += len(text) + 1  # 改行の分
+
+    @property
+    def full(self):
+        """上限に達していれば True（上限がない場合は常に False）"""
+        return self.max_chars is not None and self.total_chars >= self.max_chars
+
 class FileExtractor:
     """ファイル内容抽出クラス - 様々な形式のファイルからテキストを抽出する"""
-    
+
+    # テキストを抽出できない場合に、ファイル情報の後に表示するメッセージ
+    _FALLBACK_MESSAGES = {
+        'pdf': "このPDFからのテキスト抽出はpypdfium2・PyPDF2ライブラリがインストールされていないか、読み取りに失敗したため利用できません。\n"
+               "pip install pypdfium2 でインストールしてください。",
+        'docx': "このWord文書からテキストを抽出できませんでした。ファイルが破損しているか、Word文書(docx)形式ではない可能性があります。",
+        'xlsx': "このExcelからデータを抽出できませんでした。ファイルが破損しているか、Excel(xlsx)形式ではない可能性があります。",
+        'pptx': "このPowerPointからテキストを抽出できませんでした。ファイルが破損しているか、PowerPoint(pptx)形式ではない可能性があります。",
+    }
+
     def __init__(self):
         """FileExtractorの初期化"""
         # 外部ライブラリのインポート状態を追跡
         self.imports = {
+            'pdfium': False,
             'pdf': False,
             'docx': False,
             'xlsx': False,
             'pptx': False,
+            'charset': False,
         }
         
         # 各種ライブラリの依存関係確認
         self._check_imports()
 
+        # 文書ファイルの拡張子ごとの抽出メソッド（引数はいずれも ファイルパス, 最大文字数, プロパティの有無）
+        self._extractors = {
+            '.pdf': self._extract_pdf,
+            '.docx': self._extract_docx,
+            '.xlsx': self._extract_xlsx,
+            '.pptx': self._extract_pptx,
+        }
+
     def _check_imports(self):
         """利用可能なライブラリをチェック"""
+        # pypdfium2 (PDF抽出用、PyPDF2より高速なため優先して使用)
+        try:
+            import pypdfium2
+            self.imports['pdfium'] = True
+            logger.info("pypdfium2が利用可能です - PDFの抽出に使用します")
+        except ImportError:
+            logger.info("pypdfium2がインストールされていません。PDFの抽出にはPyPDF2を使用します")
+
         # PyPDF (PDF抽出用)
         try:
             import PyPDF2
@@ -59,99 +140,222 @@ class FileExtractor:
         except ImportError:
             logger.warning("python-pptxがインストールされていません。'pip install python-pptx'でインストールしてください")
 
-    def extract_file_content(self, file_path):
+        # charset-normalizer (テキストファイルのエンコーディング判定用、requestsの依存ライブラリ)
+        try:
+            import charset_normalizer
+            self.imports['charset'] = True
+            logger.info("charset-normalizerが利用可能です - テキストファイルのエンコーディング判定に使用します")
+        except ImportError:
+            logger.warning("charset-normalizerがインストールされていません。'pip install charset-normalizer'でインストールしてください")
+
+    def extract_file_content(self, file_path, max_chars=None, include_properties=True, with_status=False):
         """
         ファイルの内容を抽出する
 
         Args:
             file_path: 抽出するファイルパス
+            max_chars: 抽出する最大文字数の目安（上限に達した時点で抽出を打ち切る。Noneの場合は制限なし）
+            include_properties: 文書のプロパティ（タイトル・作成者など）を含めるかどうか
+            with_status: 抽出に成功したかどうかもあわせて返すかどうか
 
         Returns:
-            ファイルの内容（文字列）
+            ファイルの内容（文字列）。with_status が True の場合は (内容, 成功したかどうか) のタプル
+            （ファイルが見つからない・読み取れないなどの理由でエラーメッセージを返した場合は失敗）
+        """
+        content, success = self._extract_file_content(file_path, max_chars, include_properties)
+        return (content, success) if with_status else content
+
+    def _extract_file_content(self, file_path, max_chars=None, include_properties=True):
+        """
+        ファイルの内容を抽出し、抽出に成功したかどうかとあわせて返す
+
+        エラーメッセージはファイルの内容が変わらなくても（権限の変更や一時的な読み取りエラーの解消で）
+        変わりうるため、呼び出し元がキャッシュしないよう失敗として区別する。
+
+        Returns:
+            tuple: (ファイルの内容またはエラーメッセージ, 成功したかどうか)
         """
         try:
-            # ファイルの存在確認
-            if not os.path.exists(file_path):
-                return f"ファイル '{os.path.basename(file_path)}' が見つかりません。削除または移動された可能性があります。"
-
-            # ファイルサイズ確認 (100MB以上は処理しない)
-            file_size = os.path.getsize(file_path)
-            if file_size > 100 * 1024 * 1024:  # 100MB
-                return f"ファイル '{os.path.basename(file_path)}' は{file_size / (1024 * 1024):.1f}MBと大きすぎるため、処理できません。"
-            
-            # アクセス権確認
-            if not os.access(file_path, os.R_OK):
-                return f"ファイル '{os.path.basename(file_path)}' へのアクセス権限がありません。"
+            # ファイルの存在・サイズ・アクセス権の確認
+            error_message = self._check_file(file_path)
+            if error_message:
+                return error_message, False
 
             # ファイルの拡張子を取得
             _, ext = os.path.splitext(file_path.lower())
 
             # ファイルタイプに応じた抽出処理
-            if ext == '.pdf':
-                return self._extract_pdf(file_path)
-            elif ext == '.docx':
-                return self._extract_docx(file_path)
-            elif ext == '.xlsx':
-                return self._extract_xlsx(file_path)
-            elif ext == '.pptx':
-                return self._extract_pptx(file_path)
-            elif ext in ['.txt', '.md', '.csv', '.json', '.xml', '.html', '.htm', '.log', '.py', '.js', '.css']:
-                return self._extract_text(file_path)
-            else:
-                # 未対応のファイル形式
-                file_info = self._get_file_info(file_path)
-                return f"未対応のファイル形式 ({ext}):\n{file_info}"
+            if ext in _TEXT_EXTS:
+                return self._extract_text(file_path, max_chars), True
+            extractor = self._extractors.get(ext)
+            if extractor:
+                return extractor(file_path, max_chars, include_properties), True
+
+            # 未対応のファイル形式
+            file_info = self._get_file_info(file_path)
+            return f"未対応のファイル形式 ({ext}):\n{file_info}", True
 
         except PermissionError:
             logger.error(f"ファイル '{file_path}' へのアクセス権限がありません")
-            return f"ファイル '{os.path.basename(file_path)}' へのアクセス権限がありません。システム管理者に確認してください。"
+            return f"ファイル '{os.path.basename(file_path)}' へのアクセス権限がありません。システム管理者に確認してください。", False
         except Exception as e:
             logger.error(f"ファイル '{file_path}' の抽出中にエラーが発生しました: {str(e)}")
             logger.error(traceback.format_exc())
-            return f"ファイル抽出エラー: {str(e)}"
+            return f"ファイル抽出エラー: {str(e)}", False
+
+    def extract_files_content(self, file_paths, max_chars=None, include_properties=True, with_status=False):
+        """
+        複数ファイルの内容をまとめて抽出する
+
+        Args:
+            file_paths: 抽出するファイルパスのリスト
+            max_chars: 1ファイルあたりの抽出する最大文字数の目安（Noneの場合は制限なし）
+            include_properties: 文書のプロパティ（タイトル・作成者など）を含めるかどうか
+            with_status: 抽出に成功したかどうかもあわせて返すかどうか
+
+        Returns:
+            dict: ファイルパスをキー、ファイルの内容（文字列）を値とする辞書
+            （with_status が True の場合、値は (内容, 成功したかどうか) のタプル）
+        """
+        # ファイルごとの抽出は互いに独立しており、読み込み待ちが多いためスレッドで並列に実行する
+        with ThreadPoolExecutor(max_workers=max(1, min(8, len(file_paths)))) as executor:
+            futures = {
+                file_path: executor.submit(self.extract_file_content, file_path, max_chars, include_properties, with_status)
+                for file_path in file_paths
+            }
+            return {file_path: futures[file_path].result() for file_path in file_paths}
 
-    def _extract_text(self, file_path):
-        """テキストファイルの内容を抽出"""
+    def _check_file(self, file_path):
+        """
+        ファイルが抽出可能かどうかを確認する
+
+        Args:
+            file_path: 確認するファイルパス
+
+        Returns:
+            抽出できない場合はその理由（文字列）、抽出できる場合は None
+        """
+        # ファイルの存在確認（存在確認とサイズ取得を1回のstatで行う）
         try:
-            # 複数のエンコーディングを試行
-            encodings = ['utf-8', 'shift-jis', 'cp932', 'euc-jp', 'iso-2022-jp']
-            
-            for encoding in encodings:
+            file_size = os.stat(file_path).st_size
+        except OSError:
+            return f"ファイル '{os.path.basename(file_path)}' が見つかりません。削除または移動された可能性があります。"
+
+        # ファイルサイズ確認 (100MB以上は処理しない)
+        if file_size > 100 * 1024 * 1024:  # 100MB
+            return f"ファイル '{os.path.basename(file_path)}' は{file_size / (1024 * 1024):.1f}MBと大きすぎるため、処理できません。"
+
+        # アクセス権確認
+        if not os.access(file_path, os.R_OK):
+            return f"ファイル '{os.path.basename(file_path)}' へのアクセス権限がありません。"
+
+        return None
+
+    def _extract_text(self, file_path, max_chars=None):
+        """テキストファイルの内容を抽出（読み取りエラーは呼び出し元で抽出の失敗として扱う）"""
+        file_size = os.path.getsize(file_path)
+
+        # 文字数の上限がある場合は、その文字数分（1文字最大4バイト）だけを読み込む
+        if max_chars is not None and file_size > max_chars * 4:
+            with open(file_path, 'rb') as f:
+                data = f.read(max_chars * 4)
+
+            content, encoding = self._decode_text(data, final=False)
+            file_info = self._get_file_info(file_path)
+            # 注意書きが切り捨てられないよう、文字数を制限してから追加する
+            content = content[:max_chars]
+            if encoding is None:
+                content += " (エンコーディングの問題があるため、一部文字化けしている可能性があります)"
+            return f"{file_info}\n\n{content}\n...(以降省略)..."
+
+        # ファイルは一度だけ読み込み、エンコーディングを判定してデコードする
+        with open(file_path, 'rb') as f:
+            data = f.read()
+
+        content, encoding = self._decode_text(data)
+        file_info = self._get_file_info(file_path)
+        if encoding is None:
+            return f"{file_info}\n\n{content} (エンコーディングの問題があるため、一部文字化けしている可能性があります)"
+        return f"{file_info}\n\n{content}"
+
+    def _decode_text(self, data, final=True):
+        """
+        バイト列のエンコーディングを判定してデコードする
+
+        Args:
+            data: テキストファイルの内容（バイト列）
+            final: data がファイルの末尾までを含むかどうか（False の場合、末尾で途切れた文字を許容）
+
+        Returns:
+            tuple: (デコードした文字列, 判定したエンコーディング。判定できなかった場合は None)
+        """
+        # BOM付きのファイルはBOMからエンコーディングが確定する（メモ帳で保存したUTF-8・UTF-16など）
+        if data.startswith(codecs.BOM_UTF8):
+            encoding = 'utf-8-sig'
+        elif data.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+            encoding = 'utf-16'
+        else:
+            encoding = None
+        if encoding:
+            return codecs.getincrementaldecoder(encoding)(errors='replace').decode(data, final), encoding
+
+        # 大半のファイルはUTF-8のため、まず厳密にデコードを試みる
+        try:
+            return codecs.getincrementaldecoder('utf-8')().decode(data, final), 'utf-8'
+        except UnicodeDecodeError:
+            pass
+
+        # 日本語のエンコーディングに限定して統計的に判定
+        if self.imports['charset']:
+            import charset_normalizer
+
+            best = charset_normalizer.from_bytes(
+                data,
+                cp_isolation=['utf_8', 'shift_jis', 'cp932', 'euc_jp', 'iso2022_jp']
+            ).best()
+            if best is not None:
+                return str(best), best.encoding
+        else:
+            for encoding in ('cp932', 'euc-jp'):
                 try:
-                    with open(file_path, 'r', encoding=encoding, errors='replace') as f:
-                        content = f.read()
-                        
-                        # ファイル情報のヘッダーを追加
-                        file_info = self._get_file_info(file_path)
-                        return f"{file_info}\n\n{content}"
+                    return codecs.getincrementaldecoder(encoding)().decode(data, final), encoding
                 except UnicodeDecodeError:
                     continue
-            
-            # すべてのエンコーディングで失敗した場合
-            with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
-                content = f.read()
-                file_info = self._get_file_info(file_path)
-                return f"{file_info}\n\n{content} (エンコーディングの問題があるため、一部文字化けしている可能性があります)"
-                
-        except Exception as e:
-            logger.error(f"テキストファイル '{file_path}' の読み込み中にエラー: {str(e)}")
-            return f"テキストファイル読み込みエラー: {str(e)}"
 
-    def _extract_pdf(self, file_path):
+        return data.decode('utf-8', errors='replace'), None
+
+    def _extract_pdf(self, file_path, max_chars=None, include_properties=True):
         """PDFファイルからテキストを抽出"""
         file_info = self._get_file_info(file_path)
-        
+
+        # pypdfium2が利用可能な場合（pdfiumエンジンで高速にテキストを抽出）
+        if self.imports['pdfium']:
+            import pypdfium2 as pdfium
+
+            try:
+                return self._extract_pdf_pdfium(file_path, file_info, max_chars, include_properties)
+            except OSError:
+                # ファイルの読み取り自体の失敗は、抽出の失敗として呼び出し元に伝える
+                raise
+            except pdfium.PdfiumError as e:
+                # pdfiumがファイルを開けなかった場合（File access error）も同様に伝える
+                if "File access error" in str(e):
+                    raise
+                logger.error(f"pypdfium2でのPDF抽出中にエラー: {str(e)}")
+            except Exception as e:
+                logger.error(f"pypdfium2でのPDF抽出中にエラー: {str(e)}")
+
         # PyPDF2が利用可能な場合
         if self.imports['pdf']:
             try:
                 import PyPDF2
                 
-                text_content = []
+                text_content = _TextCollector(max_chars)
                 with open(file_path, 'rb') as file:
                     reader = PyPDF2.PdfReader(file)
                     
                     # PDF基本情報
-                    info = reader.metadata
+                    info = reader.metadata if include_properties else None
                     if info:
                         text_content.append(f"タイトル: {info.get('/Title', '不明')}")
                         text_content.append(f"作成者: {info.get('/Author', '不明')}")
@@ -164,6 +368,8 @@ class FileExtractor:
                     
                     # 各ページのテキストを抽出
                     for i, page in enumerate(reader.pages):
+                        if text_content.full:
+                            break
                         if i < 10:  # 最初の10ページのみ抽出
                             text = page.extract_text()
                             if text:
@@ -175,49 +381,61 @@ class FileExtractor:
                 
                 return f"{file_info}\n\n" + "\n".join(text_content)
                 
+            except OSError:
+                # ファイルの読み取り自体の失敗は、抽出の失敗として呼び出し元に伝える
+                raise
             except Exception as e:
                 logger.error(f"PyPDF2でのPDF抽出中にエラー: {str(e)}")
                 logger.error(traceback.format_exc())
-                # 外部コマンドによるフォールバックを試みる
-                return self._extract_pdf_fallback(file_path, file_info)
+                # ファイル情報のみを返す
+                return self._extract_fallback('pdf', file_info)
         else:
             # PyPDF2が利用できない場合はフォールバック
-            return self._extract_pdf_fallback(file_path, file_info)
+            return self._extract_fallback('pdf', file_info)
     
-    def _extract_pdf_fallback(self, file_path, file_info):
-        """PDF抽出のフォールバックメソッド（外部コマンド使用）"""
-        try:
-            # PowerShellを使用したPDF情報抽出（テキスト抽出なし）
-            cmd = f"""
-            try {{
-                # ファイル情報の取得
-                "PDF名: {os.path.basename(file_path)}"
-                "ファイルサイズ: " + (Get-Item "{file_path}").Length + " bytes"
-                "最終更新日時: " + (Get-Item "{file_path}").LastWriteTime
-                "----------------------------------------"
-                "このPDFからのテキスト抽出はPyPDF2ライブラリがインストールされていないため利用できません。"
-                "pip install PyPDF2 でインストールしてください。"
-            }} catch {{
-                "エラーが発生しました: $_"
-            }}
-            """
-            process = subprocess.Popen(
-                ["powershell", "-ExecutionPolicy", "Bypass", "-Command", cmd],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            stdout, stderr = process.communicate()
-            
-            if stderr:
-                logger.warning(f"PDF情報取得中のエラー: {stderr}")
-            
-            return f"{file_info}\n\n{stdout}"
-        except Exception as e:
-            logger.error(f"PDF抽出フォールバック中にエラー: {str(e)}")
-            return f"{file_info}\n\nPDF抽出エラー: {str(e)}"
+    def _extract_pdf_pdfium(self, file_path, file_info, max_chars=None, include_properties=True):
+        """pypdfium2を使用してPDFファイルからテキストを抽出"""
+        import pypdfium2 as pdfium
 
-    def _extract_docx(self, file_path):
+        text_content = _TextCollector(max_chars)
+        with _PDFIUM_LOCK:
+            pdf = pdfium.PdfDocument(file_path)
+            try:
+                # PDF基本情報
+                info = pdf.get_metadata_dict() if include_properties else None
+                if info:
+                    text_content.append(f"タイトル: {info.get('Title') or '不明'}")
+                    text_content.append(f"作成者: {info.get('Author') or '不明'}")
+                    text_content.append(f"作成日: {info.get('CreationDate') or '不明'}")
+
+                # ページ数
+                num_pages = len(pdf)
+                text_content.append(f"ページ数: {num_pages}")
+                text_content.append("----------------------------------------")
+
+                # 各ページのテキストを抽出
+                for i in range(min(num_pages, 10)):  # 最初の10ページのみ抽出
+                    if text_content.full:
+                        break
+                    page = pdf[i]
+                    textpage = page.get_textpage()
+                    try:
+                        text = textpage.get_text_range()
+                    finally:
+                        textpage.close()
+                        page.close()
+                    if text:
+                        text_content.append(f"--- ページ {i+1} ---")
+                        text_content.append(text)
+
+                if num_pages > 10:
+                    text_content.append(f"\n...(残り {num_pages - 10} ページは省略)...")
+            finally:
+                pdf.close()
+
+        return f"{file_info}\n\n" + "\n".join(text_content)
+
+    def _extract_docx(self, file_path, max_chars=None, include_properties=True):
         """Word文書(docx)からテキストを抽出"""
         file_info = self._get_file_info(file_path)
         
@@ -229,10 +447,10 @@ class FileExtractor:
                 doc = docx.Document(file_path)
                 
                 # 文書情報
-                core_properties = doc.core_properties
-                text_content = []
+                text_content = _TextCollector(max_chars)
                 
-                if core_properties:
+                if include_properties and doc.core_properties:
+                    core_properties = doc.core_properties
                     text_content.append(f"タイトル: {core_properties.title or '不明'}")
                     text_content.append(f"作成者: {core_properties.author or '不明'}")
                     text_content.append(f"最終更新者: {core_properties.last_modified_by or '不明'}")
@@ -242,11 +460,13 @@ class FileExtractor:
                 text_content.append("文書内容:")
                 
                 for i, para in enumerate(doc.paragraphs):
+                    if text_content.full:
+                        break
                     if para.text.strip():
                         text_content.append(para.text)
                 
                 # テーブルの内容を抽出
-                if doc.tables:
+                if doc.tables and not text_content.full:
                     text_content.append("\n--- テーブル内容 ---")
                     for i, table in enumerate(doc.tables):
                         if i < 5:  # 最初の5つのテーブルのみ処理
@@ -262,47 +482,40 @@ class FileExtractor:
                 
             except Exception as e:
                 logger.error(f"python-docxでのWord抽出中にエラー: {str(e)}")
-                # 外部コマンドによるフォールバックを試みる
-                return self._extract_docx_fallback(file_path, file_info)
-        else:
-            # python-docxが利用できない場合はフォールバック
-            return self._extract_docx_fallback(file_path, file_info)
-    
-    def _extract_docx_fallback(self, file_path, file_info):
-        """Word抽出のフォールバックメソッド（外部コマンド使用）"""
+
+        # python-docxが利用できない場合は、zipfileで文書のXMLを直接読み取る
         try:
-            # PowerShellを使用したWord文書の情報抽出
-            cmd = f"""
-            try {{
-                # ファイル情報の取得
-                "Word文書名: {os.path.basename(file_path)}"
-                "ファイルサイズ: " + (Get-Item "{file_path}").Length + " bytes"
-                "最終更新日時: " + (Get-Item "{file_path}").LastWriteTime
-                "----------------------------------------"
-                "このWord文書からのテキスト抽出はpython-docxライブラリがインストールされていないため利用できません。"
-                "pip install python-docx でインストールしてください。"
-            }} catch {{
-                "エラーが発生しました: $_"
-            }}
-            """
-            process = subprocess.Popen(
-                ["powershell", "-ExecutionPolicy", "Bypass", "-Command", cmd],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            stdout, stderr = process.communicate()
-            
-            if stderr:
-                logger.warning(f"Word情報取得中のエラー: {stderr}")
-            
-            return f"{file_info}\n\n{stdout}"
-        except Exception as e:
-            logger.error(f"Word抽出フォールバック中にエラー: {str(e)}")
-            return f"{file_info}\n\nWord抽出エラー: {str(e)}"
+            return self._extract_docx_zip(file_path, file_info, max_chars)
+        except (zipfile.BadZipFile, KeyError, ET.ParseError) as e:
+            logger.error(f"zipfileでのWord抽出中にエラー: {str(e)}")
+            # ファイル情報のみを返す
+            return self._extract_fallback('docx', file_info)
 
-    def _extract_xlsx(self, file_path):
-        """Excelファイル(xlsx)からデータを抽出"""
+    def _extract_docx_zip(self, file_path, file_info, max_chars=None):
+        """Word文書(docx)の本文XMLをzipfileから直接ストリーム解析してテキストを抽出"""
+        text_content = _TextCollector(max_chars)
+        text_content.append("----------------------------------------")
+        text_content.append("文書内容:")
+
+        with zipfile.ZipFile(file_path) as archive, archive.open('word/document.xml') as xml_file:
+            paragraph = []
+            for _, element in ET.iterparse(xml_file):
+                if element.tag == _W_T:
+                    paragraph.append(element.text or "")
+                elif element.tag == _W_P:
+                    text = "".join(paragraph)
+                    if text.strip():
+                        text_content.append(text)
+                    paragraph = []
+                    # 処理済みの段落を解放してメモリ使用量を抑える
+                    element.clear()
+                    if text_content.full:
+                        break
+
+        return f"{file_info}\n\n" + "\n".join(text_content)
+    
+    def _extract_xlsx(self, file_path, max_chars=None, include_properties=True):
+        """Excelファイル(xlsx)からデータを抽出（include_properties は他の形式と引数をそろえるためのもので、出力するプロパティはない）"""
         file_info = self._get_file_info(file_path)
         
         # openpyxlが利用可能な場合
@@ -310,77 +523,117 @@ class FileExtractor:
             try:
                 import openpyxl
                 
-                workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+                # 外部リンク先のデータは抽出に使わないため読み込まない
+                workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
                 
-                text_content = []
-                text_content.append(f"ブック名: {os.path.basename(file_path)}")
-                text_content.append(f"シート数: {len(workbook.sheetnames)}")
-                text_content.append(f"シート一覧: {', '.join(workbook.sheetnames)}")
-                text_content.append("----------------------------------------")
+                text_content = _TextCollector(max_chars)
+                try:
+                    text_content.append(f"ブック名: {os.path.basename(file_path)}")
+                    text_content.append(f"シート数: {len(workbook.sheetnames)}")
+                    text_content.append(f"シート一覧: {', '.join(workbook.sheetnames)}")
+                    text_content.append("----------------------------------------")
                 
-                # 各シートの内容を抽出
-                for sheet_name in workbook.sheetnames[:5]:  # 最初の5シートのみ処理
-                    sheet = workbook[sheet_name]
-                    text_content.append(f"--- シート: {sheet_name} ---")
+                    # 各シートの内容を抽出
+                    for sheet_name in workbook.sheetnames[:5]:  # 最初の5シートのみ処理
+                        if text_content.full:
+                            break
+                        sheet = workbook[sheet_name]
+                        text_content.append(f"--- シート: {sheet_name} ---")
                     
-                    row_count = 0
-                    for row in sheet.iter_rows(max_row=50):  # 最初の50行のみ処理
-                        row_data = []
-                        for cell in row:
-                            row_data.append(str(cell.value if cell.value is not None else ""))
-                        text_content.append("\t".join(row_data))
-                        row_count += 1
+                        row_count = 0
+                        # セルオブジェクトを生成せず、行単位で値のタプルを取得
+                        for row in sheet.iter_rows(max_row=50, values_only=True):  # 最初の50行のみ処理
+                            text_content.append("\t".join("" if value is None else str(value) for value in row))
+                            row_count += 1
+                            if text_content.full:
+                                break
                     
-                    if row_count == 50:
-                        text_content.append("...(以降省略)...")
+                        if row_count == 50:
+                            text_content.append("...(以降省略)...")
                     
-                    text_content.append("")
-                
-                workbook.close()
+                        text_content.append("")
+                finally:
+                    # 読み取り専用モードはファイルハンドルを保持するため、例外時も必ず閉じる
+                    workbook.close()
+
                 return f"{file_info}\n\n" + "\n".join(text_content)
                 
             except Exception as e:
                 logger.error(f"openpyxlでのExcel抽出中にエラー: {str(e)}")
-                # 外部コマンドによるフォールバックを試みる
-                return self._extract_xlsx_fallback(file_path, file_info)
-        else:
-            # openpyxlが利用できない場合はフォールバック
-            return self._extract_xlsx_fallback(file_path, file_info)
-    
-    def _extract_xlsx_fallback(self, file_path, file_info):
-        """Excel抽出のフォールバックメソッド（外部コマンド使用）"""
+
+        # openpyxlが利用できない場合は、zipfileでシートのXMLを直接読み取る
         try:
-            # PowerShellを使用したExcelファイルの情報抽出
-            cmd = f"""
-            try {{
-                # ファイル情報の取得
-                "Excel名: {os.path.basename(file_path)}"
-                "ファイルサイズ: " + (Get-Item "{file_path}").Length + " bytes"
-                "最終更新日時: " + (Get-Item "{file_path}").LastWriteTime
-                "----------------------------------------"
-                "このExcelからのデータ抽出はopenpyxlライブラリがインストールされていないため利用できません。"
-                "pip install openpyxl でインストールしてください。"
-            }} catch {{
-                "エラーが発生しました: $_"
-            }}
-            """
-            process = subprocess.Popen(
-                ["powershell", "-ExecutionPolicy", "Bypass", "-Command", cmd],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            stdout, stderr = process.communicate()
-            
-            if stderr:
-                logger.warning(f"Excel情報取得中のエラー: {stderr}")
-            
-            return f"{file_info}\n\n{stdout}"
-        except Exception as e:
-            logger.error(f"Excel抽出フォールバック中にエラー: {str(e)}")
-            return f"{file_info}\n\nExcel抽出エラー: {str(e)}"
+            return self._extract_xlsx_zip(file_path, file_info, max_chars)
+        except (zipfile.BadZipFile, KeyError, ET.ParseError) as e:
+            logger.error(f"zipfileでのExcel抽出中にエラー: {str(e)}")
+            # ファイル情報のみを返す
+            return self._extract_fallback('xlsx', file_info)
+
+    def _extract_xlsx_zip(self, file_path, file_info, max_chars=None):
+        """Excelファイル(xlsx)のシートXMLをzipfileから直接ストリーム解析してデータを抽出"""
+        with zipfile.ZipFile(file_path) as archive:
+            # 共有文字列テーブル（文字列セルはこの表のインデックスを参照する）
+            shared_strings = []
+            if 'xl/sharedStrings.xml' in archive.namelist():
+                with archive.open('xl/sharedStrings.xml') as xml_file:
+                    for _, element in ET.iterparse(xml_file):
+                        if element.tag == _S_SI:
+                            shared_strings.append("".join(t.text or "" for t in element.iter(_S_T)))
+                            element.clear()
+
+            # シート名と対応するXMLファイル
+            targets = {
+                rel.get('Id'): rel.get('Target')
+                for rel in ET.fromstring(archive.read('xl/_rels/workbook.xml.rels')).iter(_RELATIONSHIP)
+            }
+            sheets = [
+                (sheet.get('name'), targets.get(sheet.get(_R_ID), ''))
+                for sheet in ET.fromstring(archive.read('xl/workbook.xml')).iter(_S_SHEET)
+            ]
+
+            text_content = _TextCollector(max_chars)
+            text_content.append(f"ブック名: {os.path.basename(file_path)}")
+            text_content.append(f"シート数: {len(sheets)}")
+            text_content.append(f"シート一覧: {', '.join(name for name, _ in sheets)}")
+            text_content.append("----------------------------------------")
+
+            for sheet_name, target in sheets[:5]:  # 最初の5シートのみ処理
+                if text_content.full:
+                    break
+                text_content.append(f"--- シート: {sheet_name} ---")
+                sheet_path = target.lstrip('/') if target.startswith('/') else f"xl/{target}"
+
+                row_count = 0
+                with archive.open(sheet_path) as xml_file:
+                    for _, element in ET.iterparse(xml_file):
+                        if element.tag != _S_ROW:
+                            continue
 
-    def _extract_pptx(self, file_path):
+                        values = []
+                        for cell in element.iter(_S_C):
+                            cell_type = cell.get('t')
+                            value = cell.find(_S_V)
+                            if cell_type == 's' and value is not None:
+                                values.append(shared_strings[int(value.text)])
+                            elif cell_type == 'inlineStr':
+                                values.append("".join(t.text or "" for t in cell.iter(_S_T)))
+                            else:
+                                values.append("" if value is None else value.text or "")
+                        text_content.append("\t".join(values))
+                        element.clear()
+
+                        row_count += 1
+                        if row_count == 50:  # 最初の50行のみ処理
+                            text_content.append("...(以降省略)...")
+                            break
+                        if text_content.full:
+                            break
+
+                text_content.append("")
+
+        return f"{file_info}\n\n" + "\n".join(text_content)
+    
+    def _extract_pptx(self, file_path, max_chars=None, include_properties=True):
         """PowerPointファイル(pptx)からテキストを抽出"""
         file_info = self._get_file_info(file_path)
         
@@ -391,13 +644,15 @@ class FileExtractor:
                 
                 presentation = pptx.Presentation(file_path)
                 
-                text_content = []
+                text_content = _TextCollector(max_chars)
                 text_content.append(f"プレゼンテーション名: {os.path.basename(file_path)}")
                 text_content.append(f"スライド数: {len(presentation.slides)}")
                 text_content.append("----------------------------------------")
                 
                 # 各スライドからテキストを抽出
                 for i, slide in enumerate(presentation.slides):
+                    if text_content.full:
+                        break
                     if i < 20:  # 最初の20スライドのみ処理
                         text_content.append(f"--- スライド {i+1} ---")
                         
@@ -420,44 +675,71 @@ class FileExtractor:
                 
             except Exception as e:
                 logger.error(f"python-pptxでのPowerPoint抽出中にエラー: {str(e)}")
-                # 外部コマンドによるフォールバックを試みる
-                return self._extract_pptx_fallback(file_path, file_info)
-        else:
-            # python-pptxが利用できない場合はフォールバック
-            return self._extract_pptx_fallback(file_path, file_info)
-    
-    def _extract_pptx_fallback(self, file_path, file_info):
-        """PowerPoint抽出のフォールバックメソッド（外部コマンド使用）"""
+
+        # python-pptxが利用できない場合は、zipfileでスライドのXMLを直接読み取る
         try:
-            # PowerShellを使用したPowerPointファイルの情報抽出
-            cmd = f"""
-            try {{
-                # ファイル情報の取得
-                "PowerPoint名: {os.path.basename(file_path)}"
-                "ファイルサイズ: " + (Get-Item "{file_path}").Length + " bytes"
-                "最終更新日時: " + (Get-Item "{file_path}").LastWriteTime
-                "----------------------------------------"
-                "このPowerPointからのテキスト抽出はpython-pptxライブラリがインストールされていないため利用できません。"
-                "pip install python-pptx でインストールしてください。"
-            }} catch {{
-                "エラーが発生しました: $_"
-            }}
-            """
-            process = subprocess.Popen(
-                ["powershell", "-ExecutionPolicy", "Bypass", "-Command", cmd],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
+            return self._extract_pptx_zip(file_path, file_info, max_chars, include_properties)
+        except (zipfile.BadZipFile, KeyError, ET.ParseError) as e:
+            logger.error(f"zipfileでのPowerPoint抽出中にエラー: {str(e)}")
+            # ファイル情報のみを返す
+            return self._extract_fallback('pptx', file_info)
+
+    def _extract_pptx_zip(self, file_path, file_info, max_chars=None, include_properties=True):
+        """PowerPointファイル(pptx)のスライドXMLをzipfileから直接ストリーム解析してテキストを抽出"""
+        with zipfile.ZipFile(file_path) as archive:
+            names = archive.namelist()
+
+            # スライド番号順に並べる（名前順では slide10 が slide2 より前になるため）
+            slides = sorted(
+                (int(match.group(1)), name)
+                for match, name in ((_SLIDE_NAME_RE.match(name), name) for name in names)
+                if match
             )
-            stdout, stderr = process.communicate()
-            
-            if stderr:
-                logger.warning(f"PowerPoint情報取得中のエラー: {stderr}")
-            
-            return f"{file_info}\n\n{stdout}"
-        except Exception as e:
-            logger.error(f"PowerPoint抽出フォールバック中にエラー: {str(e)}")
-            return f"{file_info}\n\nPowerPoint抽出エラー: {str(e)}"
+
+            text_content = _TextCollector(max_chars)
+            text_content.append(f"プレゼンテーション名: {os.path.basename(file_path)}")
+            if include_properties and 'docProps/core.xml' in names:
+                title = ET.fromstring(archive.read('docProps/core.xml')).find(_DC_TITLE)
+                if title is not None and title.text:
+                    text_content.append(f"タイトル: {title.text}")
+            text_content.append(f"スライド数: {len(slides)}")
+            text_content.append("----------------------------------------")
+
+            for i, (_, name) in enumerate(slides[:20]):  # 最初の20スライドのみ処理
+                if text_content.full:
+                    break
+                text_content.append(f"--- スライド {i+1} ---")
+
+                with archive.open(name) as xml_file:
+                    paragraph = []
+                    for _, element in ET.iterparse(xml_file):
+                        if element.tag == _A_T:
+                            paragraph.append(element.text or "")
+                        elif element.tag == _A_P:
+                            if paragraph:
+                                text_content.append("".join(paragraph))
+                            paragraph = []
+                            element.clear()
+
+                text_content.append("")
+
+            if len(slides) > 20:
+                text_content.append(f"...(残り {len(slides) - 20} スライドは省略)...")
+
+        return f"{file_info}\n\n" + "\n".join(text_content)
+    
+    def _extract_fallback(self, file_type, file_info):
+        """
+        テキストを抽出できない場合に、ファイル情報のみを返す
+
+        Args:
+            file_type: ファイルの種類（'pdf', 'docx', 'xlsx', 'pptx'）
+            file_info: ファイル情報（_get_file_info の結果）
+
+        Returns:
+            ファイル情報と抽出できなかった旨のメッセージ（文字列）
+        """
+        return f"{file_info}\n\n----------------------------------------\n{self._FALLBACK_MESSAGES[file_type]}"
 
     def _get_file_info(self, file_path):
         """ファイルの基本情報を取得"""
@@ -0,0 +1,318 @@
+# file_index.py - OneDriveファイルの永続インデックス（SQLite）
+import os
+import sys
+import stat
+import logging
+import secrets
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# インデックスのテーブル構成のバージョン（変更時は既存のインデックスを作り直す）
+_SCHEMA_VERSION = 5
+
+# 走査しないディレクトリ（同期されたリポジトリやごみ箱など、検索対象にならないもの）
+SKIP_DIRS = frozenset({'.git', 'node_modules', '__pycache__', '.venv', '$RECYCLE.BIN', 'System Volume Information'})
+
+def should_skip_entry(entry):
+    """
+    走査対象から除外するエントリかどうかを判定する
+
+    Args:
+        entry: os.DirEntry
+
+    Returns:
+        bool: 除外する場合は True
+    """
+    # Officeの一時ファイル（~$で始まる）と除外ディレクトリ
+    if entry.name in SKIP_DIRS or entry.name.startswith('~$'):
+        return True
+
+    # Windowsでは隠し・システム属性のエントリも除外（DirEntry.statは列挙時の情報を使うため追加のI/Oなし）
+    if sys.platform == 'win32':
+        attributes = entry.stat(follow_symlinks=False).st_file_attributes
+        return bool(attributes & (stat.FILE_ATTRIBUTE_HIDDEN | stat.FILE_ATTRIBUTE_SYSTEM))
+
+    return False
+
+# OneDriveのオンライン専用ファイル（内容を読むとクラウドからのダウンロードが発生する）を示す属性
+# RECALL_ON_OPEN / RECALL_ON_DATA_ACCESS は stat モジュールに定義されていないため値を直接指定する
+_FILE_ATTRIBUTE_RECALL_ON_OPEN = 0x00040000
+_FILE_ATTRIBUTE_RECALL_ON_DATA_ACCESS = 0x00400000
+_CLOUD_ONLY_ATTRIBUTES = (
+    stat.FILE_ATTRIBUTE_OFFLINE | _FILE_ATTRIBUTE_RECALL_ON_OPEN | _FILE_ATTRIBUTE_RECALL_ON_DATA_ACCESS
+)
+
+def is_cloud_only(file_stat):
+    """
+    オンライン専用（ローカルに内容がない）ファイルかどうかを判定する
+
+    OneDriveのファイルはすべてリパースポイントのため、REPARSE_POINT属性では判定しない。
+
+    Args:
+        file_stat: os.stat_result
+
+    Returns:
+        bool: オンライン専用の場合は True（Windows以外では常に False）
+    """
+    return bool(getattr(file_stat, 'st_file_attributes', 0) & _CLOUD_ONLY_ATTRIBUTES)
+
+class IndexedEntry:
+    """インデックスの1行を os.DirEntry と同じ形（path, name, stat()）で扱うためのクラス"""
+
+    __slots__ = ('path', 'name')
+
+    def __init__(self, path, name):
+        self.path = path
+        self.name = name
+
+    def stat(self):
+        """ファイルの最新の状態を取得（インデックス作成後に変更されている可能性があるため）"""
+        return os.stat(self.path)
+
+class FileIndex:
+    """検索基準ディレクトリ配下のファイル一覧をSQLiteに保持し、変更のあったディレクトリのみ再走査するインデックス"""
+
+    def __init__(self, root, index_path, refresh_interval=60):
+        """
+        FileIndexの初期化
+
+        Args:
+            root: インデックス対象のディレクトリ
+            index_path: インデックスを保存するSQLiteファイルのパス
+            refresh_interval: インデックスを再確認する最小間隔（秒）
+        """
+        self.root = os.path.abspath(root)
+        self.index_path = index_path
+        self.refresh_interval = refresh_interval
+        self.last_refresh = 0
+        self.generation = 0
+        self.database_id = None
+
+        # Flaskの複数スレッドから使用されるため、接続は共有してロックで保護する
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        self._conn = sqlite3.connect(index_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] != _SCHEMA_VERSION:
+            self._conn.executescript(f"""
+                DROP TABLE IF EXISTS meta;
+                DROP TABLE IF EXISTS dirs;
+                DROP TABLE IF EXISTS files_fts;
+                DROP TABLE IF EXISTS files;
+                PRAGMA user_version = {_SCHEMA_VERSION};
+            """)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS dirs (
+                path TEXT PRIMARY KEY,
+                parent TEXT,
+                mtime_ns INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS idx_dirs_parent ON dirs(parent);
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                dir TEXT NOT NULL,
+                name TEXT NOT NULL,
+                name_lower TEXT NOT NULL,
+                ext TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_files_dir ON files(dir);
+            CREATE INDEX IF NOT EXISTS idx_files_ext ON files(ext);
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value INTEGER
+            );
+        """)
+
+        # インデックスの内容が変わるたびに増える世代番号（再起動後も比較できるよう保存しておく）
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        self.generation = row[0] if row else 0
+
+        # データベースごとの識別子（作り直した場合は世代番号が0から数え直されるため、以前の世代番号と区別する）
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'database_id'").fetchone()
+        if row:
+            self.database_id = row[0]
+        else:
+            self.database_id = secrets.randbits(62)
+            with self._conn:
+                self._conn.execute(
+                    "INSERT INTO meta (key, value) VALUES ('database_id', ?)",
+                    (self.database_id,)
+                )
+
+        # ファイル名の全文検索インデックス（trigramトークナイザは空白で区切られない日本語の部分一致にも使える）
+        self.fts_enabled = False
+        try:
+            self._conn.executescript("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5(
+                    name_lower, content='files', content_rowid='rowid', tokenize='trigram'
+                );
+                CREATE TRIGGER IF NOT EXISTS files_fts_insert AFTER INSERT ON files BEGIN
+                    INSERT INTO files_fts(rowid, name_lower) VALUES (new.rowid, new.name_lower);
+                END;
+                CREATE TRIGGER IF NOT EXISTS files_fts_delete AFTER DELETE ON files BEGIN
+                    INSERT INTO files_fts(files_fts, rowid, name_lower) VALUES ('delete', old.rowid, old.name_lower);
+                END;
+            """)
+            # INSERT OR REPLACE で置き換えられた行にも削除トリガーを適用する
+            self._conn.execute("PRAGMA recursive_triggers=ON")
+            self.fts_enabled = True
+        except sqlite3.OperationalError as e:
+            # SQLite 3.34より前はtrigramトークナイザが使えない
+            logger.warning(f"ファイル名の全文検索インデックスを使用できません: {str(e)}")
+
+        logger.info(f"ファイルインデックスを開きました: {index_path}")
+
+    def refresh(self, force=False):
+        """
+        インデックスを差分更新する
+
+        ディレクトリの更新日時が前回と同じ場合、そのディレクトリ直下のエントリは変わっていないため
+        再列挙せず、インデックスに記録済みの子ディレクトリだけを確認する。
+
+        Args:
+            force: 最小間隔に関係なく更新するかどうか
+        """
+        with self._lock:
+            if not force and time.time() - self.last_refresh < self.refresh_interval:
+                return
+
+            start_time = time.time()
+            seen_dirs = set()
+            scanned_dirs = 0
+
+            with self._conn:
+                stack = [(self.root, None)]
+                while stack:
+                    directory, parent = stack.pop()
+                    seen_dirs.add(directory)
+
+                    try:
+                        mtime_ns = os.stat(directory).st_mtime_ns
+                    except OSError:
+                        # 削除されたディレクトリは後でまとめてインデックスから除去される
+                        seen_dirs.discard(directory)
+                        continue
+
+                    row = self._conn.execute("SELECT mtime_ns FROM dirs WHERE path = ?", (directory,)).fetchone()
+                    if row and row[0] == mtime_ns:
+                        # 変更なし: 子ディレクトリはインデックスから取得
+                        child_rows = self._conn.execute("SELECT path FROM dirs WHERE parent = ?", (directory,))
+                        stack.extend((child_path, directory) for (child_path,) in child_rows)
+                        continue
+
+                    # 変更あり: ディレクトリを再列挙してファイル一覧を置き換える
+                    subdirs, files = self._scan_directory(directory)
+                    scanned_dirs += 1
+                    self._conn.execute("DELETE FROM files WHERE dir = ?", (directory,))
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO files (path, dir, name, name_lower, ext) VALUES (?, ?, ?, ?, ?)",
+                        files
+                    )
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO dirs (path, parent, mtime_ns) VALUES (?, ?, ?)",
+                        (directory, parent, mtime_ns)
+                    )
+                    stack.extend((subdir, directory) for subdir in subdirs)
+
+                # 見つからなくなったディレクトリとそのファイルを除去
+                removed_dirs = [
+                    (path,) for (path,) in self._conn.execute("SELECT path FROM dirs")
+                    if path not in seen_dirs
+                ]
+                if removed_dirs:
+                    self._conn.executemany("DELETE FROM files WHERE dir = ?", removed_dirs)
+                    self._conn.executemany("DELETE FROM dirs WHERE path = ?", removed_dirs)
+
+                if scanned_dirs or removed_dirs:
+                    self.generation += 1
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO meta (key, value) VALUES ('generation', ?)",
+                        (self.generation,)
+                    )
+
+            self.last_refresh = time.time()
+            logger.info(
+                f"ファイルインデックスを更新しました: 確認 {len(seen_dirs)}ディレクトリ, "
+                f"再走査 {scanned_dirs}ディレクトリ, 削除 {len(removed_dirs)}ディレクトリ, "
+                f"処理時間 {self.last_refresh - start_time:.2f}秒"
+            )
+
+    def _scan_directory(self, directory):
+        """
+        ディレクトリ直下のエントリを列挙する
+
+        Args:
+            directory: 列挙するディレクトリ
+
+        Returns:
+            tuple: (子ディレクトリのリスト, filesテーブルに挿入する行のリスト)
+        """
+        subdirs = []
+        files = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if should_skip_entry(entry):
+                            continue
+                        # シンボリックリンク（リパースポイント）の先には入らない
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            # ファイルの更新日時・サイズはインデックスに持たない
+                            # （ファイルを更新してもディレクトリの更新日時は変わらず古くなるため、検索結果の作成時に取得する。
+                            #   再走査のたびにファイルごとのstat呼び出しが発生するのも避けられる）
+                            # SQLiteのlower()はASCIIのみ対応のため、小文字化した名前も保存しておく
+                            name_lower = entry.name.lower()
+                            ext = os.path.splitext(name_lower)[1]
+                            files.append((entry.path, directory, entry.name, name_lower, ext))
+                    except OSError:
+                        continue
+        except OSError as e:
+            logger.warning(f"ディレクトリを読み取れませんでした: {directory} ({str(e)})")
+        return subdirs, files
+
+    def iter_entries(self, extensions=None, name_terms=None):
+        """
+        インデックス内のファイルを列挙する
+
+        Args:
+            extensions: 対象とする拡張子（小文字、ドット付き）の集合。Noneの場合は全ファイル
+            name_terms: いずれかをファイル名に含むファイルのみ対象とするキーワード（小文字）。Noneの場合は絞り込まない
+
+        Returns:
+            list: IndexedEntry のリスト
+        """
+        # 絞り込みはSQLite側でまとめて行い、Python側でファイルごとに判定する件数を減らす
+        conditions = []
+        params = []
+        if extensions:
+            conditions.append(f"ext IN ({', '.join('?' for _ in extensions)})")
+            params.extend(sorted(extensions))
+        if name_terms:
+            if self.fts_enabled and all(len(term) >= 3 for term in name_terms):
+                # trigramは3文字以上の語であれば全文検索インデックスで部分一致を検索できる
+                conditions.append("rowid IN (SELECT rowid FROM files_fts WHERE files_fts MATCH ?)")
+                params.append(" OR ".join('"' + term.replace('"', '""') + '"' for term in name_terms))
+            else:
+                conditions.append("(" + " OR ".join("instr(name_lower, ?) > 0" for _ in name_terms) + ")")
+                params.extend(name_terms)
+
+        sql = "SELECT path, name FROM files"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+
+        return [IndexedEntry(path, name) for path, name in rows]
+
+    def close(self):
+        """インデックスの接続を閉じる"""
+        with self._lock:
+            self._conn.close()
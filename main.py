@@ -119,7 +119,12 @@ if config['ONEDRIVE_SEARCH_ENABLED']:
         onedrive_search = OneDriveSearch(
             base_directory=base_directory,
             file_types=file_types,
-            max_results=max_files
+            max_results=max_files,
+            use_index=config['ONEDRIVE_INDEX_ENABLED'],
+            index_refresh_interval=config['ONEDRIVE_INDEX_REFRESH_INTERVAL'],
+            include_cloud_only=config['ONEDRIVE_INCLUDE_CLOUD_ONLY'],
+            text_cache_enabled=config['ONEDRIVE_TEXT_CACHE_ENABLED'],
+            text_cache_max_mb=config['ONEDRIVE_TEXT_CACHE_MAX_MB']
         )
         logger.info(f"OneDrive検索機能を初期化しました: {base_directory}")
         logger.info("ファイル抽出機能も初期化されました")
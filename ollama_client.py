@@ -31,6 +31,7 @@ def generate_ollama_response(query, ollama_url, ollama_model, ollama_timeout, on
 
         # OneDrive検索が有効かつクエリがある場合は関連情報を検索
         onedrive_context = ""
+        cloud_only_note = ""
         search_path = ""
         if onedrive_search and clean_query:
             # 検索ディレクトリのパスを取得（短縮表示用）
@@ -59,6 +60,11 @@ def generate_ollama_response(query, ollama_url, ollama_model, ollama_timeout, on
                         onedrive_context = f"\n\n注意: {date_str}の日報は検索ディレクトリ（{short_path}）から見つかりませんでした。"
                     else:
                         onedrive_context = f"\n\n注意: 関連する日報ファイルは検索ディレクトリ（{short_path}）から見つかりませんでした。"
+
+                    # オンライン専用ファイルを除外した場合は、その旨の注記（最終行）も伝える
+                    if relevant_content and "オンライン専用ファイル" in relevant_content:
+                        cloud_only_note = f"\n{relevant_content.splitlines()[-1]}"
+                        onedrive_context += cloud_only_note
                     
                     logger.info("関連情報は見つかりませんでした")
             except Exception as e:
@@ -110,7 +116,7 @@ def generate_ollama_response(query, ollama_url, ollama_model, ollama_timeout, on
 3. ファイル名が通常と異なる形式で保存されている
 4. アクセス権限の問題でファイルが見つけられない
 
-この日付の日報内容については情報がないため、お答えできません。別の日付をお試しいただくか、システム管理者にお問い合わせください。"""
+この日付の日報内容については情報がないため、お答えできません。別の日付をお試しいただくか、システム管理者にお問い合わせください。{cloud_only_note}"""
                 else:
                     short_path = get_shortened_path(search_path)
                     prompt = f"""以下の質問に日本語で丁寧に回答してください。
@@ -118,7 +124,7 @@ def generate_ollama_response(query, ollama_url, ollama_model, ollama_timeout, on
 質問: {clean_query}
 
 ご質問の日報データは検索ディレクトリ（{short_path}）から見つかりませんでした。具体的な日付（例：2024年10月26日、2024/10/26、20241026など）を指定すると検索できる可能性があります。
-日報検索には、日付を含めた形で質問していただくとより正確に検索できます。"""
+日報検索には、日付を含めた形で質問していただくとより正確に検索できます。{cloud_only_note}"""
             else:
                 # OneDriveコンテキストを含むプロンプト
                 if onedrive_context:
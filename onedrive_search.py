@@ -1,18 +1,111 @@
 # onedrive_search.py - OneDriveファイル検索機能（file_extractorと連携）
 import os
 import logging
-import subprocess
 import re
 import time
 import json
+import hashlib
+import sqlite3
+import tempfile
+import threading
+import queue
+from collections import OrderedDict
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from file_extractor import FileExtractor
+from file_index import FileIndex, should_skip_entry, is_cloud_only
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
+# 日付の検出用パターン（モジュール読み込み時に一度だけコンパイル）
+_JAPANESE_DATE_RE = re.compile(r'(?P<year>\d{4})年(?P<month>\d{1,2})月(?P<day>\d{1,2})日')
+_SLASH_DATE_RE = re.compile(r'(?P<year>\d{4})[/-](?P<month>\d{1,2})[/-](?P<day>\d{1,2})')
+_NUMERIC_DATE_RE = re.compile(r'^(?P<year>\d{4})(?P<month>\d{2})(?P<day>\d{2})$')
+_NUMERIC_DATE_IN_TEXT_RE = re.compile(r'\b(?P<year>\d{4})(?P<month>\d{2})(?P<day>\d{2})\b')
+
+def _find_date(text, numeric_pattern=_NUMERIC_DATE_RE):
+    """
+    文字列から日付を検出する
+
+    1. YYYY年MM月DD日、2. YYYY/MM/DD または YYYY-MM-DD、3. YYYYMMDD（8桁の数字）の順に確認し、
+    前の形式が見つかった場合、後の形式は検索しない。日付として存在しないもの（例: 20241399）は無視する。
+
+    Args:
+        text: 日付を検出する文字列
+        numeric_pattern: YYYYMMDD形式の判定に使うパターン（文字列全体か、文中の8桁の数字か）
+
+    Returns:
+        tuple: (年, 月, 日, 形式名)。年月日は整数。見つからない場合は None
+    """
+    for pattern, format_name in ((_JAPANESE_DATE_RE, "和暦形式"), (_SLASH_DATE_RE, "スラッシュ区切り形式"), (numeric_pattern, "数値形式")):
+        match = pattern.search(text)
+        if match:
+            year, month, day = int(match.group('year')), int(match.group('month')), int(match.group('day'))
+            try:
+                datetime(year, month, day)
+            except ValueError:
+                continue
+            return year, month, day, format_name
+    return None
+
+def _date_patterns(year, month, day):
+    """
+    日付からファイル名の照合に使う表記をまとめて生成する
+
+    Args:
+        year: 年
+        month: 月
+        day: 日
+
+    Returns:
+        tuple: (YYYYMMDD, YYYY-MM-DD, YYYY/MM/DD, YYYY年MM月DD日)
+    """
+    return (
+        f"{year:04d}{month:02d}{day:02d}",
+        f"{year:04d}-{month:02d}-{day:02d}",
+        f"{year:04d}/{month:02d}/{day:02d}",
+        f"{year:04d}年{month:02d}月{day:02d}日"
+    )
+
+# ファイル内容のディスクキャッシュの形式のバージョン（上げると既存のキャッシュは使用されなくなる。
+# 2: 抽出に失敗した場合のエラーメッセージを保存しないようにした）
+_TEXT_CACHE_VERSION = 2
+
+# 関連コンテンツに含める1ファイルあたりのプレビュー文字数
+_PREVIEW_CHARS = 2000
+
+# クエリの単語の前後から取り除く句読点・括弧・引用符（report.docx や v1.2 のように単語内にあるものは残す）
+_TOKEN_STRIP_CHARS = ',.;:!?()[]{}"\''
+
+# クエリから除去するストップワード
+_STOP_WORDS = frozenset([
+    "について", "とは", "の", "を", "に", "は", "で", "が", "と", "から", "へ", "より",
+    "内容", "知りたい", "あったのか", "何", "教えて", "どのような", "どんな", "ありました",
+    "the", "a", "an", "and", "or", "of", "to", "in", "for", "on", "by"
+])
+
+@lru_cache(maxsize=256)
+def _compile_term_pattern(terms):
+    """
+    検索語のタプルから、いずれかを含むかを判定する正規表現をコンパイルする
+
+    Args:
+        terms: 小文字化・重複除去済みの検索語のタプル
+
+    Returns:
+        コンパイル済みの正規表現
+    """
+    # 長い語を先に並べ、共通の接頭辞を持つ語（日付の各形式など）で無駄な後戻りを減らす
+    return re.compile('|'.join(re.escape(term) for term in sorted(terms, key=len, reverse=True)))
+
 class OneDriveSearch:
-    def __init__(self, base_directory=None, file_types=None, max_results=10):
+    # 検出したOneDriveのルートディレクトリ（実行環境ごとに変わらないため、インスタンス間で共有する）
+    _onedrive_root_cache = None
+
+    def __init__(self, base_directory=None, file_types=None, max_results=10, use_index=True, index_refresh_interval=60,
+                 include_cloud_only=False, text_cache_enabled=True, text_cache_max_mb=512):
         """
         OneDrive検索クラスの初期化
 
@@ -20,28 +113,19 @@ class OneDriveSearch:
             base_directory: 検索の基準ディレクトリ（指定がない場合はOneDriveルート）
             file_types: 検索対象のファイル拡張子リスト
             max_results: デフォルトの最大検索結果数
+            use_index: ファイルインデックスを使用するかどうか
+            index_refresh_interval: ファイルインデックスを再確認する最小間隔（秒）
+            include_cloud_only: オンライン専用（未ダウンロード）のファイルも検索結果に含めるかどうか
+            text_cache_enabled: 抽出したファイル内容をディスクにキャッシュするかどうか
+            text_cache_max_mb: ディスクキャッシュの合計サイズの上限（MB）
         """
-        # OneDriveのルートディレクトリを取得（環境に応じて調整が必要）
-        self.onedrive_root = os.path.expanduser("~/OneDrive")
-
         # ユーザー名を取得
         self.username = os.getenv("USERNAME", "owner")
 
-        if not os.path.exists(self.onedrive_root):
-            # 標準的なOneDriveパスが見つからない場合は代替パスを試す
-            alt_paths = [
-                os.path.expanduser("~/OneDrive - Company"),  # 企業アカウント用
-                os.path.expanduser("~/OneDrive - Personal"),  # 個人アカウント用
-                f"C:\\Users\\{self.username}\\OneDrive",  # 絶対パス
-                f"D:\\OneDrive",  # 別ドライブ
-                # 共立電機製作所のパターンを追加
-                f"C:\\Users\\{self.username}\\OneDrive - 株式会社　共立電機製作所"
-            ]
-
-            for path in alt_paths:
-                if os.path.exists(path):
-                    self.onedrive_root = path
-                    break
+        # OneDriveのルートディレクトリを取得（検出は最初のインスタンス作成時のみ行う）
+        if OneDriveSearch._onedrive_root_cache is None:
+            OneDriveSearch._onedrive_root_cache = self._find_onedrive_root(self.username)
+        self.onedrive_root = OneDriveSearch._onedrive_root_cache
 
         logger.info(f"OneDriveルートディレクトリ: {self.onedrive_root}")
 
@@ -57,14 +141,88 @@ class OneDriveSearch:
         self.max_results = max_results
         logger.info(f"デフォルト最大検索結果数: {self.max_results}")
 
-        # 検索結果キャッシュ（パフォーマンス向上のため）
-        self.search_cache = {}
+        # オンライン専用ファイルの扱い（含める場合、内容の読み取り時にダウンロードが発生する）
+        self.include_cloud_only = include_cloud_only
+
+        # 検索結果キャッシュ（パフォーマンス向上のため、再起動後も再利用できるようディスクに保存）
+        self.cache_dir = os.path.join(tempfile.gettempdir(), "onedrive_search")
+        self.search_cache_path = os.path.join(self.cache_dir, "search_cache.json")
         self.cache_expiry = 300  # キャッシュの有効期限（秒）
+        self._search_cache_size = 128  # キャッシュする検索条件の上限（超えた場合は最も古く使われたものから削除）
+        self._cache_lock = threading.Lock()
+        self.search_cache = self._load_search_cache()
+
+        # ファイルインデックス（検索のたびにディレクトリ全体を走査しないため）
+        self.file_index = None
+        if use_index:
+            try:
+                index_name = hashlib.blake2b(os.path.abspath(self.base_directory).encode('utf-8'), digest_size=8).hexdigest()
+                self.file_index = FileIndex(
+                    self.base_directory,
+                    os.path.join(self.cache_dir, f"index_{index_name}.sqlite3"),
+                    refresh_interval=index_refresh_interval
+                )
+            except Exception as e:
+                logger.warning(f"ファイルインデックスを初期化できませんでした。検索時にディレクトリを直接走査します: {str(e)}")
         
         # ファイル抽出器の初期化
         self.file_extractor = FileExtractor()
         logger.info("ファイル抽出器を初期化しました")
 
+        # 抽出済みファイル内容のキャッシュ（キー: (パス, 更新日時, サイズ)、LRUで上限を管理）
+        self._content_cache = OrderedDict()
+        self._content_cache_size = 256
+        self._content_cache_max_chars = 16 * 1024 * 1024  # キャッシュする内容の合計文字数の上限（全文読み込みの大きなファイル対策）
+        self._content_cache_chars = 0
+        self._content_cache_lock = threading.Lock()
+
+        # 抽出済みファイル内容のディスクキャッシュ（再起動後も抽出をやり直さないため。合計サイズは使用順で管理）
+        # 文書の内容を平文で保存するため、無効にすることもできる
+        self.text_cache_enabled = text_cache_enabled
+        self.text_cache_dir = os.path.join(self.cache_dir, "text_cache")
+        self._text_cache_max_bytes = text_cache_max_mb * 1024 * 1024
+        self._text_cache_bytes = None  # 最初の保存時にディレクトリを走査して求める
+        self._text_cache_lock = threading.Lock()
+        # 利用できる抽出ライブラリが変わると抽出結果も変わるため、キャッシュのファイル名に含める
+        self._text_cache_variant = ",".join(sorted(name for name, available in self.file_extractor.imports.items() if available))
+
+        # 関連コンテンツのキャッシュ（キー: (クエリ, 最大ファイル数, 最大文字数)、同じ質問の繰り返しでは検索・抽出を行わない）
+        self._relevant_cache = OrderedDict()
+        self._relevant_cache_size = 64
+        self._relevant_cache_expiry = 60  # ファイルの内容を含むため、検索結果キャッシュより短くする
+        self._relevant_cache_lock = threading.Lock()
+
+    @staticmethod
+    def _find_onedrive_root(username):
+        """
+        OneDriveのルートディレクトリを検出する（環境に応じて調整が必要）
+
+        Args:
+            username: Windowsのユーザー名
+
+        Returns:
+            OneDriveのルートディレクトリのパス（見つからない場合は標準のパス）
+        """
+        onedrive_root = os.path.expanduser("~/OneDrive")
+
+        if not os.path.exists(onedrive_root):
+            # 標準的なOneDriveパスが見つからない場合は代替パスを試す
+            alt_paths = [
+                os.path.expanduser("~/OneDrive - Company"),  # 企業アカウント用
+                os.path.expanduser("~/OneDrive - Personal"),  # 個人アカウント用
+                f"C:\\Users\\{username}\\OneDrive",  # 絶対パス
+                f"D:\\OneDrive",  # 別ドライブ
+                # 共立電機製作所のパターンを追加
+                f"C:\\Users\\{username}\\OneDrive - 株式会社　共立電機製作所"
+            ]
+
+            for path in alt_paths:
+                if os.path.isdir(path):
+                    onedrive_root = path
+                    break
+
+        return onedrive_root
+
     def search_files(self, keywords, file_types=None, max_results=None, use_cache=True):
         """
         OneDrive内のファイルをキーワードで検索
@@ -78,6 +236,16 @@ class OneDriveSearch:
         Returns:
             検索結果のリスト [{'path': ファイルパス, 'name': ファイル名, 'modified': 更新日時}]
         """
+        results, _ = self._search_files(keywords, file_types, max_results, use_cache)
+        return results
+
+    def _search_files(self, keywords, file_types=None, max_results=None, use_cache=True):
+        """
+        OneDrive内のファイルをキーワードで検索し、除外したオンライン専用ファイルの件数もあわせて返す
+
+        Returns:
+            (検索結果のリスト, 除外したオンライン専用ファイルの件数) のタプル
+        """
         # デフォルト値の設定
         if file_types is None:
             file_types = self.file_types
@@ -86,18 +254,26 @@ class OneDriveSearch:
             max_results = self.max_results
 
         # キャッシュキーの生成
-        cache_key = f"{str(keywords)}_{str(file_types)}_{max_results}"
+        cache_key = self._make_cache_key(keywords, file_types, max_results)
+
+        # 検索基準ディレクトリの更新日時（変更されていればキャッシュを使用しない）
+        base_mtime_ns = self._get_base_mtime_ns()
 
         # キャッシュチェック
-        if use_cache and cache_key in self.search_cache:
-            cache_entry = self.search_cache[cache_key]
+        cache_entry = self.search_cache.get(cache_key)
+        if use_cache and cache_entry:
             cache_time = cache_entry['timestamp']
             current_time = time.time()
 
-            # キャッシュが有効期限内なら使用
-            if current_time - cache_time < self.cache_expiry:
+            # ディレクトリが変更されておらず、キャッシュが有効期限内であれば使用
+            # （有効期限を過ぎていても、インデックス上で変更がなければ期限を延長して使用）
+            if cache_entry.get('base_mtime_ns') == base_mtime_ns and (
+                    current_time - cache_time < self.cache_expiry or self._revalidate_cache_entry(cache_entry)):
+                with self._cache_lock:
+                    if cache_key in self.search_cache:
+                        self.search_cache.move_to_end(cache_key)
                 logger.info(f"キャッシュから検索結果を返します: {len(cache_entry['results'])}件")
-                return cache_entry['results']
+                return cache_entry['results'], cache_entry.get('cloud_only_skipped', 0)
 
         # キーワードを文字列から配列に変換
         if isinstance(keywords, str):
@@ -109,70 +285,18 @@ class OneDriveSearch:
 
         for k in keywords:
             # 複数のフォーマットに対応する日付パターン検出
-            # 1. YYYY年MM月DD日 形式
-            japanese_date_match = re.search(r'(\d{4})年(\d{1,2})月(\d{1,2})日', k)
-            
-            # 2. YYYY/MM/DD または YYYY-MM-DD 形式
-            slash_date_match = re.search(r'(\d{4})[/-](\d{1,2})[/-](\d{1,2})', k)
-            
-            # 3. YYYYMMDD 形式 (8桁の数字)
-            numeric_date_match = re.search(r'^(\d{4})(\d{2})(\d{2})$', k)
-            
-            # パターンに応じてフォーマット
-            if japanese_date_match:
-                year = japanese_date_match.group(1)
-                month = japanese_date_match.group(2).zfill(2)  # 1桁の月を2桁に
-                day = japanese_date_match.group(3).zfill(2)    # 1桁の日を2桁に
-                logger.info(f"和暦形式の日付を検出: {year}年{month}月{day}日")
-                date_pattern = f"{year}{month}{day}"
-                date_pattern2 = f"{year}-{month}-{day}"
-                date_pattern3 = f"{year}/{month}/{day}"
-                date_keywords.extend([date_pattern, date_pattern2, date_pattern3])
-            elif slash_date_match:
-                year = slash_date_match.group(1)
-                month = slash_date_match.group(2).zfill(2)
-                day = slash_date_match.group(3).zfill(2)
-                logger.info(f"スラッシュ区切り日付を検出: {year}/{month}/{day}")
-                date_pattern = f"{year}{month}{day}"
-                date_pattern2 = f"{year}-{month}-{day}"
-                date_pattern3 = f"{year}/{month}/{day}"
-                date_keywords.extend([date_pattern, date_pattern2, date_pattern3])
-            elif numeric_date_match:
-                year = numeric_date_match.group(1)
-                month = numeric_date_match.group(2)
-                day = numeric_date_match.group(3)
-                logger.info(f"数値形式の日付を検出: {year}{month}{day}")
-                date_pattern = f"{year}{month}{day}"
-                date_pattern2 = f"{year}-{month}-{day}"
-                date_pattern3 = f"{year}/{month}/{day}"
-                date_keywords.extend([date_pattern, date_pattern2, date_pattern3])
-            # 4. YYYYMMDD パターンを探す (キーワードが8桁の数字のみで構成されている場合)
-            elif k.isdigit() and len(k) == 8:
-                year = k[:4]
-                month = k[4:6]
-                day = k[6:8]
-                # 有効な日付かどうかを確認
-                try:
-                    # 日付としての妥当性をチェック
-                    datetime(int(year), int(month), int(day))
-                    logger.info(f"数値形式の日付を検出: {year}{month}{day}")
-                    date_pattern = k
-                    date_pattern2 = f"{year}-{month}-{day}"
-                    date_pattern3 = f"{year}/{month}/{day}"
-                    date_keywords.extend([date_pattern, date_pattern2, date_pattern3])
-                except ValueError:
-                    # 数字だけど日付として無効な場合は通常のキーワードとして扱う
-                    if len(k) > 2 and re.search(r'[ぁ-んァ-ン一-龥]', k):
-                        search_terms.append(k)
+            date = _find_date(k)
+            if date:
+                year, month, day, format_name = date
+                patterns = _date_patterns(year, month, day)
+                logger.info(f"{format_name}の日付を検出: {patterns[3]}")
+                date_keywords.extend(patterns)
             else:
-                # 日本語検索キーワードは短くして検索精度を上げる
-                if len(k) > 2 and re.search(r'[ぁ-んァ-ン一-龥]', k):
-                    search_terms.append(k)
-                else:
-                    search_terms.append(k)
+                search_terms.append(k)
 
-        # 少なくとも日付キーワードは追加
+        # 少なくとも日付キーワードは追加（同じ日付を複数の形式で指定した場合などの重複は除く）
         if date_keywords:
+            date_keywords = list(dict.fromkeys(date_keywords))
             search_terms.extend(date_keywords)
 
         # 検索キーワードがない場合、元のキーワードの先頭2つを使用
@@ -186,148 +310,91 @@ class OneDriveSearch:
         logger.info(f"OneDrive検索を実行: キーワード={search_terms}, ファイルタイプ={file_types}")
 
         try:
-            # 検索パスのエスケープ
-            search_path = self.base_directory.replace('\\', '\\\\')
-
-            # ファイルタイプのフィルタ文字列を構築
-            extension_filter = ""
+            # 拡張子フィルタ（大文字小文字を区別しない）
+            extensions = None
             if file_types:
-                ext_conditions = []
-                for ext in file_types:
-                    clean_ext = ext.replace('.', '')
-                    ext_conditions.append(f"$_.Extension -eq '.{clean_ext}'")
-
-                if ext_conditions:
-                    extension_filter = f"({' -or '.join(ext_conditions)})"
+                extensions = frozenset('.' + ext.replace('.', '').lower() for ext in file_types)
 
             # 日付キーワードと通常キーワードで異なる検索戦略を使用
-            date_conditions = []
-            keyword_conditions = []
-
-            # 日付パターンの検索条件
+            # それぞれを1つの正規表現にまとめ、ファイル名ごとの走査を1回で済ませる
+            date_terms_re = self._compile_terms(date_keywords)
+            date_keyword_set = set(date_keywords)
+            name_terms = list(dict.fromkeys(term.lower() for term in search_terms if term not in date_keyword_set))  # 重複を避ける
+            name_terms_re = self._compile_terms(name_terms)
+
+            # 日付フォルダ構造にも対応（例：2023/10/26 や 2023-10-26 のようなフォルダ）
+            date_folder_patterns = []
             for date_key in date_keywords:
-                # ファイル名に日付が含まれるかより柔軟に検索
-                date_conditions.append(f"$_.Name -like '*{date_key}*' -or $_.Name -match '{date_key}'")
-                
-                # 日付フォルダ構造にも対応（例：2023/10/26 や 2023-10-26 のようなフォルダ）
                 if len(date_key) == 8 and date_key.isdigit():  # YYYYMMDD形式
                     year = date_key[:4]
                     month = date_key[4:6]
                     day = date_key[6:8]
-                    date_folder_pattern = f"*\\\\{year}*\\\\{month}*\\\\{day}*"
-                    date_conditions.append(f"$_.FullName -like '{date_folder_pattern}'")
-
-            # 通常キーワードの検索条件
-            for term in search_terms:
-                if term not in date_keywords:  # 重複を避ける
-                    keyword_conditions.append(f"$_.Name -like '*{term}*'")
-
-            # 検索条件の組み立て
-            search_condition = ""
-            if date_conditions:
-                date_part = f"({' -or '.join(date_conditions)})"
-                if keyword_conditions:
-                    keyword_part = f"({' -or '.join(keyword_conditions)})"
-                    search_condition = f"{date_part} -and {keyword_part}"
-                else:
-                    search_condition = date_part
-            elif keyword_conditions:
-                search_condition = f"({' -or '.join(keyword_conditions)})"
-            else:
-                # 検索条件がない場合は全ファイルを対象に
-                search_condition = "$true"
-
-            # 複合条件を構築
-            if extension_filter and search_condition:
-                full_condition = f"{search_condition} -and {extension_filter}"
-            elif extension_filter:
-                full_condition = extension_filter
-            else:
-                full_condition = search_condition
-
-            # PowerShellコマンドの構築（改善版）
-            ps_command = f"""
-            $OutputEncoding = [System.Text.Encoding]::UTF8
-            [Console]::OutputEncoding = [System.Text.Encoding]::UTF8
-            $ErrorActionPreference = "Continue"
-            $results = @()
-            try {{
-                $files = Get-ChildItem -Path "{search_path}" -Recurse -File -ErrorAction SilentlyContinue
-                $filtered = $files | Where-Object {{ {full_condition} }} | Select-Object -First {max_results}
-                foreach ($file in $filtered) {{
-                    $results += @{{
-                        path = $file.FullName
-                        name = $file.Name
-                        modified = $file.LastWriteTime.ToString("yyyy-MM-dd HH:mm:ss")
-                        size = $file.Length
-                    }}
-                }}
-                ConvertTo-Json -InputObject $results -Depth 2
-            }} catch {{
-                Write-Error "エラーが発生しました: $_"
-                ConvertTo-Json -InputObject @() -Depth 2
-            }}
-            """
-
-            # コマンド実行
-            logger.debug(f"実行するPowerShellコマンド: {ps_command}")
-
-            # PowerShellを起動（エンコーディングを明示的に指定）
-            process = subprocess.Popen(
-                ["powershell", "-ExecutionPolicy", "Bypass", "-NoProfile", "-Command", ps_command],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=False  # バイナリモードに変更
-            )
-
-            stdout, stderr = process.communicate()
-
-            # バイナリ出力の適切な処理
-            try:
-                # 複数のエンコーディングでの解読を試みる
-                stdout_text = None
-                for encoding in ['utf-8', 'shift-jis', 'cp932']:
-                    try:
-                        stdout_text = stdout.decode(encoding, errors='replace')
-                        if stdout_text and '[' in stdout_text:
-                            break
-                    except:
-                        continue
-                
-                if not stdout_text:
-                    stdout_text = stdout.decode('utf-8', errors='replace')
-                
-                # ステラーエラー出力の処理
-                if stderr:
-                    try:
-                        stderr_text = stderr.decode('utf-8', errors='replace')
-                        logger.error(f"PowerShell検索エラー: {stderr_text}")
-                    except:
-                        logger.error("PowerShell検索エラー: デコードできないエラーメッセージ")
-            except Exception as e:
-                logger.error(f"PowerShell出力のデコード中にエラー: {str(e)}")
-                stdout_text = ""
+                    date_folder_patterns.append(re.compile(rf"[\\/]{year}.*[\\/]{month}.*[\\/]{day}"))
+
+            # インデックスが使用できればインデックスから、できなければディレクトリを直接走査
+            entries = None
+            walker = None
+            index_generation = None
+            index_database_id = None
+            stop_event = threading.Event()
+            if self.file_index:
+                try:
+                    self.file_index.refresh()
+                    entries = self.file_index.iter_entries(extensions, name_terms)
+                    index_generation = self.file_index.generation
+                    index_database_id = self.file_index.database_id
+                except sqlite3.Error as e:
+                    logger.warning(f"ファイルインデックスを使用できないため、ディレクトリを直接走査します: {str(e)}")
+            if entries is None:
+                walker = self._walk_scandir(os.path.abspath(self.base_directory), stop_event, extensions)
+                entries = walker
 
-            # 結果の解析
             results = []
-            if stdout_text:
+            cloud_only_skipped = 0
+            for entry in entries:
+                name = entry.name.lower()
+
+                # ファイルタイプの条件はインデックス・走査の時点で適用済み
+
+                # 日付の条件（ファイル名またはフォルダ構造に日付を含む）
+                if date_terms_re:
+                    if not (date_terms_re.search(name) or
+                            any(pattern.search(entry.path) for pattern in date_folder_patterns)):
+                        continue
+
+                # 通常キーワードの条件（いずれかのキーワードをファイル名に含む）
+                if name_terms_re and not name_terms_re.search(name):
+                    continue
+
                 try:
-                    json_start = stdout_text.find('[')
-                    if json_start >= 0:
-                        json_data = stdout_text[json_start:]
-                        parsed_data = json.loads(json_data)
-
-                        # 結果が1件の場合、配列に変換
-                        if isinstance(parsed_data, dict):
-                            results = [parsed_data]
-                        else:
-                            results = parsed_data
-                    else:
-                        logger.warning(f"JSON形式の検索結果が見つかりませんでした: {stdout_text[:100]}...")
+                    file_stat = entry.stat()
+                except OSError:
+                    # インデックス作成後に削除・移動されたファイル
+                    continue
+
+                # オンライン専用ファイルは内容の読み取り時にダウンロードが発生するため除外
+                if not self.include_cloud_only and is_cloud_only(file_stat):
+                    cloud_only_skipped += 1
+                    continue
+
+                results.append({
+                    'path': entry.path,
+                    'name': entry.name,
+                    'modified': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(file_stat.st_mtime)),
+                    'size': file_stat.st_size
+                })
+
+                if len(results) >= max_results:
+                    # 並列走査中のワーカーにも打ち切りを知らせる
+                    stop_event.set()
+                    break
+
+            if walker is not None:
+                # 走査を途中で打ち切った場合、ワーカーの終了をここで待つ（ガベージコレクション任せにしない）
+                walker.close()
 
-                except json.JSONDecodeError as e:
-                    logger.error(f"JSON解析エラー: {e}")
-                    logger.debug(f"解析できないJSON: {stdout_text[:200]}...")
+            if cloud_only_skipped:
+                logger.info(f"オンライン専用ファイルを除外しました: {cloud_only_skipped}件")
 
             # 結果のフォーマットと表示
             logger.info(f"検索結果: {len(results)}件")
@@ -335,37 +402,515 @@ class OneDriveSearch:
                 logger.info(f"結果{i+1}: {result.get('name')} - {result.get('path')}")
 
             # キャッシュに保存
-            self.search_cache[cache_key] = {
-                'results': results,
-                'timestamp': time.time()
-            }
-
-            return results
+            with self._cache_lock:
+                self.search_cache[cache_key] = {
+                    'results': results,
+                    'timestamp': time.time(),
+                    'base_mtime_ns': base_mtime_ns,
+                    'index_generation': index_generation,
+                    'index_database_id': index_database_id,
+                    'cloud_only_skipped': cloud_only_skipped
+                }
+                self.search_cache.move_to_end(cache_key)
+                while len(self.search_cache) > self._search_cache_size:
+                    self.search_cache.popitem(last=False)
+            self._save_search_cache()
+
+            return results, cloud_only_skipped
 
         except Exception as e:
             logger.error(f"OneDrive検索中にエラーが発生しました: {str(e)}")
             logger.error(f"詳細: {str(e.__class__.__name__)}")
-            return []
+            return [], 0
 
-    def read_file_content(self, file_path):
+    def _revalidate_cache_entry(self, cache_entry):
+        """
+        有効期限を過ぎた検索結果キャッシュが、まだ使用できるかを確認する
+
+        ファイルインデックスのデータベースと世代番号が検索時から変わっていなければ、検索対象のファイル構成は
+        変わっていないため、結果のファイルの更新日時・サイズのみを取得し直して使用する。
+
+        Args:
+            cache_entry: 検索結果キャッシュのエントリ
+
+        Returns:
+            bool: 使用できる場合は True（エントリの結果とタイムスタンプは更新される）
+        """
+        if not self.file_index or cache_entry.get('index_generation') is None:
+            return False
+
+        try:
+            self.file_index.refresh()
+        except sqlite3.Error:
+            return False
+        # インデックスを作り直した場合は世代番号が偶然一致することがあるため、データベースの識別子も比較する
+        if (self.file_index.database_id != cache_entry.get('index_database_id') or
+                self.file_index.generation != cache_entry['index_generation']):
+            return False
+
+        results = []
+        for result in cache_entry['results']:
+            try:
+                file_stat = os.stat(result['path'])
+            except OSError:
+                return False
+            # 検索後に「空き領域を増やす」でオンライン専用になったファイルがあれば再検索する
+            if not self.include_cloud_only and is_cloud_only(file_stat):
+                return False
+            results.append(dict(
+                result,
+                modified=time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(file_stat.st_mtime)),
+                size=file_stat.st_size
+            ))
+
+        with self._cache_lock:
+            cache_entry['results'] = results
+            cache_entry['timestamp'] = time.time()
+        logger.info("ファイル構成に変更がないため、検索結果キャッシュの有効期限を延長しました")
+        return True
+
+    def _make_cache_key(self, keywords, file_types, max_results):
+        """
+        検索条件から安定したキャッシュキーを生成する（キーワードの順序・大文字小文字・重複、拡張子の表記に依存しない）
+
+        Args:
+            keywords: 検索キーワード（文字列またはリスト）
+            file_types: 検索対象の拡張子リスト
+            max_results: 最大結果数
+
+        Returns:
+            str: キャッシュキー（ハッシュ値）
+        """
+        # 検索時と同じ正規化を行う（ファイル名の照合は小文字で行い、拡張子は「.小文字」にそろえる）
+        keyword_list = keywords.split() if isinstance(keywords, str) else keywords
+        normalized_keywords = sorted({keyword.lower() for keyword in keyword_list})
+        normalized_types = sorted({'.' + ext.replace('.', '').lower() for ext in file_types or []})
+        key_source = json.dumps(
+            [self.base_directory, normalized_keywords, normalized_types, max_results, self.include_cloud_only],
+            ensure_ascii=False
+        )
+        return hashlib.blake2b(key_source.encode('utf-8'), digest_size=16).hexdigest()
+
+    def _get_base_mtime_ns(self):
+        """検索基準ディレクトリの更新日時（ナノ秒）を取得する"""
+        try:
+            return os.stat(self.base_directory).st_mtime_ns
+        except OSError:
+            return None
+
+    def _load_search_cache(self):
+        """
+        ディスクに保存された検索結果キャッシュを読み込む
+
+        Returns:
+            OrderedDict: キャッシュ（使用順、読み込めない場合は空）
+        """
+        try:
+            with open(self.search_cache_path, 'r', encoding='utf-8') as f:
+                search_cache = OrderedDict(json.load(f))
+            # 保存時の使用順を維持したまま上限を超える分を削除
+            while len(search_cache) > self._search_cache_size:
+                search_cache.popitem(last=False)
+            logger.info(f"検索結果キャッシュを読み込みました: {len(search_cache)}件")
+            return search_cache
+        except FileNotFoundError:
+            return OrderedDict()
+        except Exception as e:
+            logger.warning(f"検索結果キャッシュの読み込みに失敗しました: {str(e)}")
+            return OrderedDict()
+
+    def _save_search_cache(self):
+        """検索結果キャッシュをディスクに保存する（一時ファイル経由で置き換え）"""
+        try:
+            with self._cache_lock:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                tmp_path = f"{self.search_cache_path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self.search_cache, f, ensure_ascii=False)
+                os.replace(tmp_path, self.search_cache_path)
+        except Exception as e:
+            logger.warning(f"検索結果キャッシュの保存に失敗しました: {str(e)}")
+
+    def _compile_terms(self, terms):
+        """
+        複数の検索語を、いずれかを含むかを判定する1つの正規表現にまとめる
+
+        Args:
+            terms: 検索語のリスト
+
+        Returns:
+            小文字化した名前に対して使用するパターン（検索語がない場合はNone）
+        """
+        if not terms:
+            return None
+        # 同じ検索語の組み合わせは毎回組み立て直さず、コンパイル済みのものを再利用する
+        return _compile_term_pattern(tuple(sorted({term.lower() for term in terms})))
+
+    def _walk_scandir(self, root, stop_event=None, extensions=None):
+        """
+        os.scandir でディレクトリを走査し、ファイルのエントリを順に返す
+
+        最上位ディレクトリのみ同期的に列挙し、その配下のサブディレクトリは
+        スレッドプールで並列に走査する（ディレクトリ列挙はI/O待ちが主なため）。
+
+        Args:
+            root: 走査を開始するディレクトリ
+            stop_event: セットされると走査を打ち切る threading.Event
+            extensions: 対象とする拡張子（小文字、ドット付き）の集合。Noneの場合は全ファイル
+
+        Yields:
+            os.DirEntry: ファイルのエントリ
+        """
+        if stop_event is None:
+            stop_event = threading.Event()
+
+        subdirs = []
+        try:
+            with os.scandir(root) as entries:
+                for entry in entries:
+                    try:
+                        # 隠しフォルダ・ごみ箱などは配下を含めて走査しない
+                        if should_skip_entry(entry):
+                            continue
+                        # シンボリックリンク（リパースポイント）の先には入らない
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False) and self._has_extension(entry.name, extensions):
+                            yield entry
+                    except OSError:
+                        continue
+        except OSError as e:
+            logger.warning(f"ディレクトリを読み取れませんでした: {root} ({str(e)})")
+
+        if not subdirs or stop_event.is_set():
+            return
+
+        entry_queue = queue.Queue()
+        max_workers = min(32, (os.cpu_count() or 1) * 4, len(subdirs))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            try:
+                for subdir in subdirs:
+                    executor.submit(self._scan_tree, subdir, entry_queue, stop_event, extensions)
+
+                # 各ワーカーは終了時に None を送る
+                pending = len(subdirs)
+                while pending:
+                    entry = entry_queue.get()
+                    if entry is None:
+                        pending -= 1
+                        continue
+                    yield entry
+            finally:
+                # 呼び出し側が途中で打ち切った場合もワーカーを止める
+                stop_event.set()
+
+    def _scan_tree(self, root, entry_queue, stop_event, extensions=None):
+        """
+        サブディレクトリ配下を走査し、ファイルのエントリをキューに送る（ワーカースレッドで実行）
+
+        Args:
+            root: 走査を開始するディレクトリ
+            entry_queue: ファイルのエントリを送る queue.Queue
+            stop_event: セットされると走査を打ち切る threading.Event
+            extensions: 対象とする拡張子（小文字、ドット付き）の集合。Noneの場合は全ファイル
+        """
+        try:
+            # 再帰呼び出しではなく明示的なスタックで走査する
+            stack = [root]
+            while stack and not stop_event.is_set():
+                directory = stack.pop()
+                try:
+                    with os.scandir(directory) as entries:
+                        for entry in entries:
+                            # 打ち切られた場合は残りのエントリも処理しない
+                            if stop_event.is_set():
+                                break
+                            try:
+                                if should_skip_entry(entry):
+                                    continue
+                                if entry.is_dir(follow_symlinks=False):
+                                    stack.append(entry.path)
+                                elif entry.is_file(follow_symlinks=False) and self._has_extension(entry.name, extensions):
+                                    entry_queue.put(entry)
+                            except OSError:
+                                continue
+                except OSError as e:
+                    logger.warning(f"ディレクトリを読み取れませんでした: {directory} ({str(e)})")
+        finally:
+            entry_queue.put(None)
+
+    def _has_extension(self, name, extensions):
+        """
+        ファイル名の拡張子が対象に含まれるかを判定する
+
+        Args:
+            name: ファイル名
+            extensions: 対象とする拡張子（小文字、ドット付き）の集合。空またはNoneの場合は常に True
+
+        Returns:
+            bool: 対象の拡張子であれば True
+        """
+        return not extensions or os.path.splitext(name)[1].lower() in extensions
+
+    def read_file_content(self, file_path, max_chars=None, include_properties=True):
         """
         ファイル抽出器を使用してファイルの内容を読み込む
 
         Args:
             file_path: 読み込むファイルパス
+            max_chars: 読み込む最大文字数の目安（Noneの場合は制限なし）
+            include_properties: 文書のプロパティ（タイトル・作成者など）を含めるかどうか
 
         Returns:
             ファイルの内容（文字列）
         """
         try:
-            # ファイル抽出器を使用
-            content = self.file_extractor.extract_file_content(file_path)
+            # ファイルが変更されていなければキャッシュから返す
+            cache_key = self._get_content_cache_key(file_path, max_chars, include_properties)
+            content = self._get_cached_content(cache_key)
+            if content is not None:
+                logger.info(f"キャッシュからファイル内容を取得しました: {file_path}")
+                return content
+
+            # ファイル抽出器を使用（抽出に失敗した場合のエラーメッセージはキャッシュしない）
+            content, success = self.file_extractor.extract_file_content(file_path, max_chars, include_properties, with_status=True)
             logger.info(f"ファイル抽出器を使用して読み込みました: {file_path}")
+            if success:
+                self._put_cached_content(cache_key, content)
             return content
         except Exception as e:
             logger.error(f"ファイル読み込み中にエラーが発生しました: {str(e)}")
             return f"ファイル読み込みエラー: {str(e)}"
 
+    def read_files_content(self, file_paths, max_chars=None, include_properties=True):
+        """
+        ファイル抽出器を使用して複数ファイルの内容をまとめて読み込む
+
+        Args:
+            file_paths: 読み込むファイルパスのリスト
+            max_chars: 1ファイルあたりの読み込む最大文字数の目安（Noneの場合は制限なし）
+            include_properties: 文書のプロパティ（タイトル・作成者など）を含めるかどうか
+
+        Returns:
+            dict: ファイルパスをキー、ファイルの内容（文字列）を値とする辞書
+        """
+        contents, _ = self._read_files_content(file_paths, max_chars, include_properties)
+        return contents
+
+    def _read_files_content(self, file_paths, max_chars=None, include_properties=True):
+        """
+        複数ファイルの内容をまとめて読み込み、抽出に失敗したファイルもあわせて返す
+
+        Returns:
+            tuple: (ファイルパスをキー、ファイルの内容を値とする辞書, 抽出に失敗したファイルパスの集合)
+        """
+        try:
+            # ファイルが変更されていなければキャッシュから取得し、残りをまとめて抽出
+            contents = {}
+            failed_paths = set()
+            cache_keys = {}
+            for file_path in file_paths:
+                cache_keys[file_path] = self._get_content_cache_key(file_path, max_chars, include_properties)
+                content = self._get_cached_content(cache_keys[file_path])
+                if content is not None:
+                    contents[file_path] = content
+
+            missing_paths = [file_path for file_path in file_paths if file_path not in contents]
+            if missing_paths:
+                extracted = self.file_extractor.extract_files_content(missing_paths, max_chars, include_properties, with_status=True)
+                for file_path, (content, success) in extracted.items():
+                    contents[file_path] = content
+                    # 抽出に失敗した場合のエラーメッセージはキャッシュしない
+                    if success:
+                        self._put_cached_content(cache_keys[file_path], content)
+                    else:
+                        failed_paths.add(file_path)
+
+            logger.info(f"ファイル抽出器を使用して{len(missing_paths)}件のファイルを読み込みました（キャッシュ: {len(file_paths) - len(missing_paths)}件）")
+            return {file_path: contents[file_path] for file_path in file_paths}, failed_paths
+        except Exception as e:
+            logger.error(f"ファイルの一括読み込み中にエラーが発生しました: {str(e)}")
+            contents = {file_path: self.read_file_content(file_path, max_chars, include_properties) for file_path in file_paths}
+            # 個別の読み込みの成否は分からないため、すべて失敗として扱う（結果をキャッシュさせない）
+            return contents, set(file_paths)
+
+    def _get_content_cache_key(self, file_path, max_chars=None, include_properties=True):
+        """
+        ファイル内容キャッシュのキーを取得
+
+        Args:
+            file_path: ファイルパス
+            max_chars: 読み込む最大文字数（上限が異なると内容も異なるためキーに含める）
+            include_properties: 文書のプロパティを含めるかどうか（同上）
+
+        Returns:
+            (パス, 更新日時(ns), サイズ, 最大文字数, プロパティの有無) のタプル。ファイルにアクセスできない場合は None
+        """
+        try:
+            file_stat = os.stat(file_path)
+        except OSError:
+            return None
+        return (file_path, file_stat.st_mtime_ns, file_stat.st_size, max_chars, include_properties)
+
+    def _get_cached_content(self, cache_key):
+        """キャッシュ（メモリ、なければディスク）からファイル内容を取得（見つからない場合は None）"""
+        if cache_key is None:
+            return None
+        with self._content_cache_lock:
+            content = self._content_cache.get(cache_key)
+            if content is not None:
+                self._content_cache.move_to_end(cache_key)
+                return content
+
+        if not self.text_cache_enabled:
+            return None
+        content = self._read_text_cache(cache_key)
+        if content is not None:
+            self._put_cached_content(cache_key, content, persist=False)
+        return content
+
+    def _put_cached_content(self, cache_key, content, persist=True):
+        """
+        ファイル内容をキャッシュに保存し、件数または合計文字数の上限を超えた場合は最も古いものから削除
+
+        Args:
+            cache_key: ファイル内容キャッシュのキー
+            content: ファイルの内容
+            persist: ディスクキャッシュにも保存するかどうか
+        """
+        if cache_key is None:
+            return
+        if persist and self.text_cache_enabled:
+            self._write_text_cache(cache_key, content)
+        if len(content) > self._content_cache_max_chars:
+            return
+        with self._content_cache_lock:
+            previous = self._content_cache.pop(cache_key, None)
+            if previous is not None:
+                self._content_cache_chars -= len(previous)
+            self._content_cache[cache_key] = content
+            self._content_cache_chars += len(content)
+            while (len(self._content_cache) > self._content_cache_size or
+                   self._content_cache_chars > self._content_cache_max_chars):
+                _, evicted = self._content_cache.popitem(last=False)
+                self._content_cache_chars -= len(evicted)
+
+    def _get_text_cache_path(self, cache_key):
+        """ファイル内容キャッシュのキーから、ディスクキャッシュのファイルパスを取得（ファイル名: ハッシュ_サイズ_更新日時.txt）"""
+        file_path, mtime_ns, size, max_chars, include_properties = cache_key
+        name_hash = hashlib.blake2b(
+            json.dumps([_TEXT_CACHE_VERSION, file_path, max_chars, include_properties, self._text_cache_variant], ensure_ascii=False).encode('utf-8'),
+            digest_size=16
+        ).hexdigest()
+        return os.path.join(self.text_cache_dir, f"{name_hash}_{size}_{mtime_ns}.txt")
+
+    def _read_text_cache(self, cache_key):
+        """ディスクキャッシュからファイル内容を読み込む（見つからない場合は None）"""
+        cache_path = self._get_text_cache_path(cache_key)
+        try:
+            with open(cache_path, 'rb') as f:
+                content = f.read().decode('utf-8')
+        except (OSError, ValueError):
+            return None
+        try:
+            # 最近使用したものを削除対象から外すため、更新日時を使用日時として記録
+            os.utime(cache_path)
+        except OSError:
+            pass
+        return content
+
+    def _write_text_cache(self, cache_key, content):
+        """ファイル内容をディスクキャッシュに保存し（一時ファイル経由で置き換え）、合計サイズの上限を超えた場合は削除"""
+        cache_path = self._get_text_cache_path(cache_key)
+        tmp_path = f"{cache_path}.{threading.get_ident()}.tmp"
+        try:
+            data = content.encode('utf-8')
+            os.makedirs(self.text_cache_dir, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, cache_path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"ファイル内容のディスクキャッシュへの保存に失敗しました: {str(e)}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+
+        with self._text_cache_lock:
+            removed_bytes = self._remove_stale_text_cache(cache_path)
+            if self._text_cache_bytes is None:
+                # 保存したファイルも含めて、既存のキャッシュの合計サイズを求める
+                self._text_cache_bytes = sum(size for _, size, _ in self._scan_text_cache())
+            else:
+                self._text_cache_bytes += len(data) - removed_bytes
+            if self._text_cache_bytes > self._text_cache_max_bytes:
+                self._prune_text_cache()
+
+    def _remove_stale_text_cache(self, cache_path):
+        """
+        保存したファイルと同じハッシュで、サイズ・更新日時の異なる古いキャッシュを削除する
+        （元のファイルが更新されると使用されなくなるため。_text_cache_lock を保持して呼び出す）
+
+        Args:
+            cache_path: 保存したディスクキャッシュのファイルパス
+
+        Returns:
+            int: 削除したファイルの合計サイズ（バイト）
+        """
+        cache_name = os.path.basename(cache_path)
+        prefix = cache_name.split('_', 1)[0] + '_'
+        removed_bytes = 0
+        for _, size, path in self._scan_text_cache():
+            name = os.path.basename(path)
+            if name.startswith(prefix) and name != cache_name:
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                removed_bytes += size
+        return removed_bytes
+
+    def _scan_text_cache(self):
+        """
+        ディスクキャッシュのファイルを列挙する
+
+        Returns:
+            list: (使用日時, サイズ, パス) のリスト
+        """
+        entries = []
+        try:
+            with os.scandir(self.text_cache_dir) as it:
+                for entry in it:
+                    if not entry.name.endswith('.txt'):
+                        continue
+                    try:
+                        file_stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((file_stat.st_mtime, file_stat.st_size, entry.path))
+        except OSError:
+            pass
+        return entries
+
+    def _prune_text_cache(self):
+        """ディスクキャッシュを、使用日時の古いものから上限の8割になるまで削除する（_text_cache_lock を保持して呼び出す）"""
+        entries = self._scan_text_cache()
+        total_bytes = sum(size for _, size, _ in entries)
+        target_bytes = self._text_cache_max_bytes * 8 // 10
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total_bytes <= target_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total_bytes -= size
+            removed += 1
+        self._text_cache_bytes = total_bytes
+        logger.info(f"ファイル内容のディスクキャッシュを整理しました: {removed}件削除, 残り {total_bytes // (1024 * 1024)}MB")
+
     def get_relevant_content(self, query, max_files=None, max_chars=8000):
         """
         クエリに関連する内容を取得
@@ -382,70 +927,41 @@ class OneDriveSearch:
         if max_files is None:
             max_files = self.max_results
 
-        # 複数のフォーマットに対応する日付抽出
+        # 同じ条件の結果がキャッシュにあり、使用したファイルが変更されていなければそのまま返す
+        cache_key = (query, max_files, max_chars)
+        with self._relevant_cache_lock:
+            cache_entry = self._relevant_cache.get(cache_key)
+        if (cache_entry and time.time() - cache_entry['timestamp'] < self._relevant_cache_expiry and
+                self._get_file_states(path for path, _, _ in cache_entry['file_states']) == cache_entry['file_states']):
+            with self._relevant_cache_lock:
+                if cache_key in self._relevant_cache:
+                    self._relevant_cache.move_to_end(cache_key)
+            logger.info("キャッシュから関連コンテンツを返します")
+            return cache_entry['content']
+
+        # 複数のフォーマットに対応する日付抽出（YYYYMMDD形式は文中の8桁の数字も対象）
         date_str = None
         date_pattern = None
-        
-        # 1. YYYY年MM月DD日 形式を確認
-        japanese_date_match = re.search(r'(\d{4})年(\d{1,2})月(\d{1,2})日', query)
-        
-        # 2. YYYY/MM/DD または YYYY-MM-DD 形式を確認
-        slash_date_match = re.search(r'(\d{4})[/-](\d{1,2})[/-](\d{1,2})', query)
-        
-        # 3. YYYYMMDD 形式（8桁の数字）を確認
-        numeric_date_match = re.search(r'\b(\d{4})(\d{2})(\d{2})\b', query)
-        
-        # 見つかった日付パターンを処理
-        if japanese_date_match:
-            year = japanese_date_match.group(1)
-            month = japanese_date_match.group(2).zfill(2)
-            day = japanese_date_match.group(3).zfill(2)
-            date_str = f"{year}年{month}月{day}日"
-            date_pattern = f"{year}{month}{day}"
-            logger.info(f"和暦形式の日付を検出: {date_str} (パターン: {date_pattern})")
-        elif slash_date_match:
-            year = slash_date_match.group(1)
-            month = slash_date_match.group(2).zfill(2)
-            day = slash_date_match.group(3).zfill(2)
-            date_str = f"{year}年{month}月{day}日"
-            date_pattern = f"{year}{month}{day}"
-            logger.info(f"スラッシュ区切り日付を検出: {date_str} (パターン: {date_pattern})")
-        elif numeric_date_match:
-            year = numeric_date_match.group(1)
-            month = numeric_date_match.group(2)
-            day = numeric_date_match.group(3)
-            date_str = f"{year}年{month}月{day}日"
-            date_pattern = f"{year}{month}{day}"
-            logger.info(f"数値形式の日付を検出: {date_str} (パターン: {date_pattern})")
-
-        # 検索クエリからストップワードを除去
-        stop_words = ["について", "とは", "の", "を", "に", "は", "で", "が", "と", "から", "へ", "より", 
-                     "内容", "知りたい", "あったのか", "何", "教えて", "どのような", "どんな", "ありました",
-                     "the", "a", "an", "and", "or", "of", "to", "in", "for", "on", "by"]
-
-        # クエリから重要な単語を抽出
-        keywords = []
-
-        # 先に日付を追加（もし存在すれば）
+        date = _find_date(query, _NUMERIC_DATE_IN_TEXT_RE)
+        if date:
+            year, month, day, format_name = date
+            date_pattern, _, _, date_str = _date_patterns(year, month, day)
+            logger.info(f"{format_name}の日付を検出: {date_str} (パターン: {date_pattern})")
+
+        # クエリから重要な単語を抽出（空白で分割して前後の句読点を除き、ストップワードと日付文字列の一部を除去）
+        keywords = [
+            word for word in (token.strip(_TOKEN_STRIP_CHARS) for token in query.split())
+            if len(word) > 1 and word.lower() not in _STOP_WORDS and (not date_str or date_str not in word)
+        ]
+
+        # 日付は先頭に置く（もし存在すれば）
         if date_str:
-            keywords.append(date_str)
-
-        # その他のキーワードを追加
-        for word in query.split():
-            clean_word = word.strip(',.;:!?()[]{}"\'')
-            if clean_word and len(clean_word) > 1 and clean_word.lower() not in stop_words:
-                # 日付文字列の一部でなければ追加
-                if date_str and date_str not in clean_word:
-                    keywords.append(clean_word)
-                elif not date_str:
-                    keywords.append(clean_word)
-                else:
-                    pass
+            keywords = [date_str] + keywords
 
         # キーワードが少なすぎる場合のバックアップとして日報関連の単語を追加
-        if len(keywords) < 2:
-            if "日報" not in query.lower() and not any(k for k in keywords if "日報" in k):
-                keywords.append("日報")
+        # （キーワードはクエリから抽出しているため、クエリに含まれるかだけを確認すればよい）
+        if len(keywords) < 2 and "日報" not in query:
+            keywords.append("日報")
 
         if not keywords:
             return "検索キーワードが見つかりませんでした。具体的な日付や単語で検索してください。"
@@ -453,35 +969,79 @@ class OneDriveSearch:
         logger.info(f"抽出されたキーワード: {keywords}")
 
         # ファイル検索
-        search_results = self.search_files(keywords, max_results=max_files)
+        search_results, cloud_only_skipped = self._search_files(keywords, max_results=max_files)
+
+        # オンライン専用ファイルを除外した場合は、見つからなかった理由がわかるようにその件数を伝える
+        cloud_only_note = ""
+        if cloud_only_skipped:
+            cloud_only_note = (f"（OneDriveのオンライン専用ファイル{cloud_only_skipped}件は、"
+                               "ダウンロードが必要なため検索対象から除外しました）")
 
         if not search_results:
-            keywords_str = ", ".join(keywords)
             # 日付指定がある場合は特別なメッセージ
             if date_str:
-                return f"{date_str}の日報は見つかりませんでした。日付の表記が正しいか確認してください。"
+                message = f"{date_str}の日報は見つかりませんでした。日付の表記が正しいか確認してください。"
             else:
-                return f"キーワード '{keywords_str}' に関連するファイルは見つかりませんでした。"
+                keywords_str = ", ".join(keywords)
+                message = f"キーワード '{keywords_str}' に関連するファイルは見つかりませんでした。"
+            if cloud_only_note:
+                message += f"\n{cloud_only_note}"
+            return message
 
-        # 関連コンテンツの取得
-        relevant_content = f"--- {len(search_results)}件の関連ファイルが見つかりました ---\n\n"
-        total_chars = len(relevant_content)
+        # 日付指定がある場合はファイル名に日付を含むものを優先（同順位は検索順を維持）
+        if date_pattern:
+            search_results = sorted(search_results, key=lambda x: date_pattern not in x.get('name', ''))
 
+        # 関連コンテンツの取得
+        # 文字列の連結を繰り返さず、リストに集めて最後に1つの文字列にする
+        header = f"--- {len(search_results)}件の関連ファイルが見つかりました ---\n"
+        if cloud_only_note:
+            header += f"{cloud_only_note}\n"
+        header += "\n"
+        relevant_content = [header]
+        total_chars = len(header)
+
+        contents = {}
+        failed_paths = set()
+        file_states = ()
+        preview_chars = _PREVIEW_CHARS
         for i, result in enumerate(search_results):
             file_path = result.get('path')
             file_name = result.get('name')
             modified = result.get('modified', '不明')
 
-            # ファイルの内容を読み込み（ファイル抽出器を使用）
-            content = self.read_file_content(file_path)
+            if file_path not in contents:
+                remaining = max_chars - total_chars - 100  # 終了メッセージ用に余裕を持たせる
+                if remaining <= 0:
+                    relevant_content.append(f"\n（残り{len(search_results) - i}件のファイルは文字数制限のため表示されません）")
+                    break
+
+                # 残りの文字数に収まるファイル数を見積もり、その分だけをまとめて読み込む（ファイル抽出器を使用）
+                # （1200文字 ≒ ヘッダー + 最低限有用なプレビュー。短いファイルばかりで文字数に余裕が残れば、
+                #   次のファイルを改めて読み込むため、表示できないファイルの抽出を避けつつ制限まで使い切れる）
+                # プレビューに使う文字数だけを抽出し、残りは読み込まない
+                # （文書のプロパティはプレビューの文字数を消費するだけのため含めない。
+                #   残りの文字数がプレビュー1件分より小さい場合は、表示できる文字数までで抽出を打ち切る）
+                preview_chars = min(_PREVIEW_CHARS, max_chars - total_chars)
+                batch_paths = [r.get('path') for r in search_results[i:i + max(1, (max_chars - total_chars) // 1200)]]
+                # 読み込み前の状態を記録する（読み込み中に変更された場合は、次回キャッシュを使用しない）
+                batch_states = self._get_file_states(batch_paths)
+                file_states = None if file_states is None or batch_states is None else file_states + batch_states
+                batch_contents, batch_failed_paths = self._read_files_content(
+                    batch_paths,
+                    max_chars=preview_chars,
+                    include_properties=False
+                )
+                contents.update(batch_contents)
+                failed_paths |= batch_failed_paths
+
+            content = contents[file_path]
 
             # コンテンツのプレビューを追加（文字数制限あり）
-            preview_length = min(2000, len(content))  # 1ファイルあたり最大2000文字
+            preview_length = min(preview_chars, len(content))  # 1ファイルあたり最大2000文字
             preview = content[:preview_length]
 
-            file_content = f"=== ファイル {i+1}: {file_name} ===\n"
-            file_content += f"更新日時: {modified}\n"
-            file_content += f"{preview}\n\n"
+            file_content = f"=== ファイル {i+1}: {file_name} ===\n更新日時: {modified}\n{preview}\n\n"
 
             # 最大文字数をチェック
             if total_chars + len(file_content) > max_chars:
@@ -491,13 +1051,47 @@ class OneDriveSearch:
                     file_content = file_content[:remaining] + "...\n"
                 else:
                     # もう追加できない場合
-                    relevant_content += f"\n（残り{len(search_results) - i}件のファイルは文字数制限のため表示されません）"
+                    relevant_content.append(f"\n（残り{len(search_results) - i}件のファイルは文字数制限のため表示されません）")
                     break
 
-            relevant_content += file_content
+            relevant_content.append(file_content)
             total_chars += len(file_content)
 
-        return relevant_content
+        content = "".join(relevant_content)
+
+        # キャッシュに保存（読み込めなかったファイルや、抽出に失敗したファイルがある場合は保存しない）
+        if file_states is not None and not failed_paths:
+            with self._relevant_cache_lock:
+                self._relevant_cache[cache_key] = {
+                    'content': content,
+                    'timestamp': time.time(),
+                    'file_states': file_states
+                }
+                self._relevant_cache.move_to_end(cache_key)
+                while len(self._relevant_cache) > self._relevant_cache_size:
+                    self._relevant_cache.popitem(last=False)
+
+        return content
+
+    @staticmethod
+    def _get_file_states(file_paths):
+        """
+        ファイルの更新日時とサイズを取得（関連コンテンツのキャッシュが使用できるかの確認用）
+
+        Args:
+            file_paths: ファイルパスのイテラブル
+
+        Returns:
+            (パス, 更新日時(ns), サイズ) のタプルのタプル。いずれかのファイルにアクセスできない場合は None
+        """
+        file_states = []
+        for file_path in file_paths:
+            try:
+                file_stat = os.stat(file_path)
+            except OSError:
+                return None
+            file_states.append((file_path, file_stat.st_mtime_ns, file_stat.st_size))
+        return tuple(file_states)
 
 # 使用例
 if __name__ == "__main__":